@@ -0,0 +1,124 @@
+# backend/compaction.py
+#
+# my_table is an append-only log: every buy/sell adds a row. Once a day is
+# older than the compaction window nothing reads its individual events, so
+# each product's rows for that day are folded into one: the day's last row is
+# kept (its stock_left, price and expiry are the end-of-day state) with
+# stock_sold set to the day's total, and the other rows are deleted.
+#
+# Keeping the last row keeps its id, so inventory.last_rowid and
+# daily_sales.last_rowid still point at it and neither derived table changes.
+# The fold runs in one IMMEDIATE transaction; VACUUM then returns the freed
+# pages to the filesystem.
+#
+#   python -m backend.compaction                      # default database, 30-day window
+#   python -m backend.compaction bench/bench.db --days 7 --no-vacuum
+#
+# In the API, set SMARTSHOP_COMPACT_INTERVAL_HOURS to run it periodically on
+# the writer thread, between group commits.
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from backend.db import DB_PATH, bump_data_version, connect_db
+from backend.migrations import migrate
+
+COMPACT_AFTER_DAYS = int(os.environ.get("SMARTSHOP_COMPACT_AFTER_DAYS", 30))
+COMPACT_INTERVAL_HOURS = float(os.environ.get("SMARTSHOP_COMPACT_INTERVAL_HOURS", 0))  # 0 = off
+
+
+def compact(conn, older_than_days=COMPACT_AFTER_DAYS, today=None, vacuum=True):
+    """
+    Fold my_table down to one row per product per day for days before the
+    window. Returns {"days": product-days compacted, "removed": rows deleted}.
+    """
+    cutoff = ((today or date.today()) - timedelta(days=older_than_days)).isoformat()
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE;")
+    try:
+        cur.execute("DROP TABLE IF EXISTS temp.compact_days;")
+        cur.execute("""
+            CREATE TEMP TABLE compact_days (
+                keep_id INTEGER PRIMARY KEY,
+                product_name TEXT,
+                date_iso TEXT,
+                sold INTEGER
+            );
+        """)
+        cur.execute("""
+            INSERT INTO compact_days (keep_id, product_name, date_iso, sold)
+            SELECT MAX(rowid), product_name, date_iso, COALESCE(SUM(stock_sold), 0)
+            FROM my_table
+            WHERE date_iso < ? AND product_name IS NOT NULL
+            GROUP BY product_name, date_iso
+            HAVING COUNT(*) > 1;
+        """, (cutoff,))
+        days = cur.execute("SELECT COUNT(*) FROM compact_days;").fetchone()[0]
+        cur.execute("""
+            UPDATE my_table
+            SET stock_sold = (SELECT sold FROM compact_days WHERE keep_id = my_table.rowid)
+            WHERE rowid IN (SELECT keep_id FROM compact_days);
+        """)
+        cur.execute("""
+            DELETE FROM my_table
+            WHERE date_iso < ?
+              AND (product_name, date_iso) IN (SELECT product_name, date_iso FROM compact_days)
+              AND rowid NOT IN (SELECT keep_id FROM compact_days);
+        """, (cutoff,))
+        removed = cur.rowcount
+        cur.execute("DROP TABLE temp.compact_days;")
+        if removed:
+            bump_data_version(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    if vacuum and removed:
+        cur.execute("VACUUM;")
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    return {"days": days, "removed": removed}
+
+
+def compact_database(older_than_days=COMPACT_AFTER_DAYS, vacuum=True):
+    """compact() on a pooled connection to the API's database."""
+    with connect_db() as conn:
+        return compact(conn, older_than_days, vacuum=vacuum)
+
+
+async def compact_periodically(writer, interval_hours=COMPACT_INTERVAL_HOURS):
+    """Background task: compact every interval_hours, queued on the writer thread."""
+    while True:
+        await asyncio.sleep(interval_hours * 3600)
+        try:
+            result = await asyncio.wrap_future(writer.submit_task(compact_database))
+            print(f"✅ Compaction → {result['days']} product-days, {result['removed']} rows removed")
+        except Exception as e:
+            print("❌ Compaction error:", e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold old my_table events into one row per product per day.")
+    parser.add_argument("db", nargs="?", default=DB_PATH)
+    parser.add_argument("--days", type=int, default=COMPACT_AFTER_DAYS, help="keep events from the last N days")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip VACUUM after compacting")
+    args = parser.parse_args(argv)
+
+    with sqlite3.connect(args.db) as conn:
+        migrate(conn)
+        conn.commit()
+        start = time.perf_counter()
+        result = compact(conn, args.days, vacuum=not args.no_vacuum)
+    print(
+        f"✅ Compacted {result['days']} product-days → {result['removed']} rows removed "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
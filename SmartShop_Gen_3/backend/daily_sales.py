@@ -0,0 +1,198 @@
+# backend/daily_sales.py
+#
+# daily_sales is the per-product, per-day rollup of my_table and the table
+# the models train on: stock_sold summed over the day, stock_left / price /
+# expiry from the day's last row, plus the model features for that day
+# (calendar fields, days to expiry, and for days with sales the change from
+# the product's previous sale day and the Increase/Decrease/Stable label).
+# Training cost therefore grows with the number of days, not with the number
+# of buy/sell events.
+#
+# Writers update the day's row in the same transaction as the my_table
+# insert, so features are computed as rows arrive. Labels use the product's
+# mean daily sale up to that day (5% of it, at least 1 unit); a rebuild
+# labels every day with the full-history mean.
+
+import sqlite3
+import sys
+from datetime import date as _date
+
+DAILY_ROWS_SQL = """
+    INSERT INTO daily_sales (
+        product_name, date_iso, product_id, stock_sold, stock_left, base_price,
+        discount_percent, expiry_iso, last_rowid,
+        month, day_of_month, day_of_week, days_to_expiry
+    )
+    SELECT g.product_name, g.date_iso, m.product_id, g.sold, m.stock_left, m.base_price,
+           m.discount_percent, m.expiry_iso, m.rowid,
+           CAST(strftime('%m', g.date_iso) AS INTEGER),
+           CAST(strftime('%d', g.date_iso) AS INTEGER),
+           (CAST(strftime('%w', g.date_iso) AS INTEGER) + 6) % 7,  -- Monday = 0
+           MAX(CAST(julianday(m.expiry_iso) - julianday(g.date_iso) AS INTEGER), 0)
+    FROM (
+        SELECT product_name, date_iso,
+               COALESCE(SUM(stock_sold), 0) AS sold,
+               MIN(rowid) AS first_id,
+               MAX(rowid) AS last_id
+        FROM my_table
+        WHERE product_name IS NOT NULL
+        GROUP BY product_name, date_iso
+    ) AS g
+    JOIN my_table AS m ON m.rowid = g.last_id
+    ORDER BY g.first_id;
+"""
+
+# Sale order follows the date; undated rows go last
+SALE_FEATURES_SQL = """
+    UPDATE daily_sales
+    SET sale_seq = s.sale_seq,
+        sales_diff = s.sales_diff,
+        trend = CASE
+            WHEN s.sales_diff > s.threshold THEN 'Increase'
+            WHEN s.sales_diff < -s.threshold THEN 'Decrease'
+            ELSE 'Stable'
+        END
+    FROM (
+        SELECT id,
+               ROW_NUMBER() OVER sales AS sale_seq,
+               stock_sold - COALESCE(LAG(stock_sold) OVER sales, stock_sold) AS sales_diff,
+               MAX(1, AVG(stock_sold) OVER (PARTITION BY product_name) * 0.05) AS threshold
+        FROM daily_sales
+        WHERE stock_sold > 0
+        WINDOW sales AS (PARTITION BY product_name ORDER BY date_iso IS NULL, date_iso)
+    ) AS s
+    WHERE daily_sales.id = s.id;
+"""
+
+
+def trend_label(diff, threshold):
+    if diff > threshold:
+        return "Increase"
+    if diff < -threshold:
+        return "Decrease"
+    return "Stable"
+
+
+def trend_threshold(mean_sale):
+    return max(1, mean_sale * 0.05)  # 5% of the product's mean daily sale
+
+
+# ==========================================================
+# FULL REBUILD
+# ==========================================================
+def rebuild_daily_sales(conn):
+    """
+    Recompute daily_sales from my_table. Runs entirely inside SQLite, so
+    memory stays flat however long the log is. Returns the number of product-days.
+    """
+    cur = conn.cursor()
+    cur.execute("DELETE FROM daily_sales;")
+    cur.execute(DAILY_ROWS_SQL)
+    cur.execute(SALE_FEATURES_SQL)
+    return cur.execute("SELECT COUNT(*) FROM daily_sales;").fetchone()[0]
+
+
+# ==========================================================
+# INCREMENTAL UPDATES
+# ==========================================================
+def _day(value):
+    try:
+        return _date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def refresh_day_features(cur, day_id):
+    """Recompute one daily_sales row's features from its totals and the product's earlier days."""
+    product, date_iso, expiry_iso, stock_sold = cur.execute(
+        "SELECT product_name, date_iso, expiry_iso, stock_sold FROM daily_sales WHERE id = ?;", (day_id,)
+    ).fetchone()
+    day, expiry = _day(date_iso), _day(expiry_iso)
+    sale_seq = sales_diff = trend = None
+
+    if stock_sold > 0 and date_iso is not None:
+        previous = cur.execute("""
+            SELECT stock_sold FROM daily_sales
+            WHERE product_name = ? AND date_iso < ? AND stock_sold > 0
+            ORDER BY date_iso DESC
+            LIMIT 1;
+        """, (product, date_iso)).fetchone()
+        count, total = cur.execute("""
+            SELECT COUNT(*), TOTAL(stock_sold) FROM daily_sales
+            WHERE product_name = ? AND date_iso <= ? AND stock_sold > 0;
+        """, (product, date_iso)).fetchone()
+        sale_seq = count
+        sales_diff = stock_sold - previous[0] if previous else 0
+        trend = trend_label(sales_diff, trend_threshold(total / count))
+
+    cur.execute("""
+        UPDATE daily_sales
+        SET month = ?, day_of_month = ?, day_of_week = ?, days_to_expiry = ?,
+            sale_seq = ?, sales_diff = ?, trend = ?
+        WHERE id = ?;
+    """, (
+        day and day.month, day and day.day, day and day.weekday(),
+        max((expiry - day).days, 0) if day and expiry else None,
+        sale_seq, sales_diff, trend, day_id,
+    ))
+
+
+def record_daily_sales(cur, after_rowid):
+    """
+    Fold the my_table rows with id > after_rowid into their daily_sales rows
+    inside the caller's transaction. Returns the ids of the touched days.
+    """
+    rows = cur.execute("""
+        SELECT rowid, product_id, product_name, date_iso, expiry_iso, stock_sold,
+               stock_left, base_price, discount_percent
+        FROM my_table
+        WHERE rowid > ? AND product_name IS NOT NULL
+        ORDER BY rowid;
+    """, (after_rowid,)).fetchall()
+
+    days = {}
+    for row_id, product_id, product, date_iso, expiry_iso, sold, stock_left, base_price, discount in rows:
+        key = (product, date_iso)
+        total = days[key][3] if key in days else 0
+        days[key] = (product_id, stock_left, base_price, total + (sold or 0), discount, expiry_iso, row_id)
+
+    touched = []
+    for (product, date_iso), (product_id, stock_left, base_price, sold, discount, expiry_iso, row_id) in days.items():
+        existing = cur.execute(
+            "SELECT id FROM daily_sales WHERE product_name = ? AND date_iso = ?;", (product, date_iso)
+        ).fetchone()
+        if existing:
+            day_id = existing[0]
+            cur.execute("""
+                UPDATE daily_sales
+                SET product_id = ?, stock_sold = stock_sold + ?, stock_left = ?, base_price = ?,
+                    discount_percent = ?, expiry_iso = ?, last_rowid = ?
+                WHERE id = ?;
+            """, (product_id, sold, stock_left, base_price, discount, expiry_iso, row_id, day_id))
+        else:
+            cur.execute("""
+                INSERT INTO daily_sales (
+                    product_name, date_iso, product_id, stock_sold, stock_left,
+                    base_price, discount_percent, expiry_iso, last_rowid
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+            """, (product, date_iso, product_id, sold, stock_left, base_price, discount, expiry_iso, row_id))
+            day_id = cur.lastrowid
+        refresh_day_features(cur, day_id)
+        touched.append(day_id)
+    return touched
+
+
+if __name__ == "__main__":
+    # Usage: python -m backend.daily_sales [path/to/my_database.db]
+    from backend.db import DB_PATH, bump_data_version
+    from backend.migrations import migrate
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+
+    with sqlite3.connect(db_path) as conn:
+        migrate(conn)
+        count = rebuild_daily_sales(conn)
+        bump_data_version(conn.cursor())
+        conn.commit()
+    print(f"✅ Daily sales rebuilt → {count} product-days")
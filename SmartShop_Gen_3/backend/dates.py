@@ -0,0 +1,53 @@
+# backend/dates.py
+#
+# Helpers for moving between the legacy dd-mm-YYYY text stored in my_table and
+# the sortable ISO-8601 columns (date_iso, expiry_iso, ts) that queries use.
+
+from datetime import datetime
+from functools import lru_cache
+import pandas as pd
+
+DATE_FORMATS = ["%Y-%m-%d", "%d-%m-%Y"]
+TIMESTAMP_FORMATS = ["%Y-%m-%d %H:%M:%S", "%d-%m-%Y %H:%M:%S", "%Y-%m-%dT%H:%M:%S"]
+
+
+def parse_date_text(value):
+    """Parse stored or user-supplied date/timestamp text; None if unparseable."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    for fmt in TIMESTAMP_FORMATS + DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+# Stored dates repeat heavily (one value per day across every product), so
+# memoizing keeps bulk conversions from re-running strptime on each row.
+@lru_cache(maxsize=65536)
+def to_iso_date(value):
+    """'15-03-2025' / '2025-03-15' → '2025-03-15'."""
+    dt = parse_date_text(value)
+    return dt.strftime("%Y-%m-%d") if dt else None
+
+
+@lru_cache(maxsize=65536)
+def to_iso_timestamp(value):
+    """'12-11-2025 20:37:24' / '2025-11-12 20:37:24' → '2025-11-12 20:37:24'."""
+    dt = parse_date_text(value)
+    return dt.strftime("%Y-%m-%d %H:%M:%S") if dt else None
+
+
+def parse_dates(values):
+    """
+    Parse a sequence of stored dates in one pass.
+    Accepts ISO-8601 as well as our legacy dd-mm-YYYY text; anything else becomes NaT.
+    """
+    values = pd.Series(values, dtype="object")
+    parsed = pd.to_datetime(values, format="ISO8601", errors="coerce")
+    missing = parsed.isna() & values.notna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(values[missing], format="%d-%m-%Y", errors="coerce")
+    return parsed
@@ -0,0 +1,258 @@
+# backend/db.py
+#
+# Shared SQLite access layer: a bounded pool of long-lived connections opened
+# in WAL mode, plus async wrappers so FastAPI handlers can await queries
+# without tying up the event loop. With WAL, dashboard reads run alongside a
+# writer and alongside long ML requests instead of queueing behind them.
+
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+import pandas as pd
+
+from backend import metrics
+
+
+# ==========================================================
+# CONFIG
+# ==========================================================
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.environ.get(
+    "SMARTSHOP_DB_PATH", os.path.join(PROJECT_DIR, "database", "my_database.db")
+)
+POOL_SIZE = int(os.environ.get("SMARTSHOP_DB_POOL_SIZE", 8))
+STATEMENT_CACHE_SIZE = int(os.environ.get("SMARTSHOP_DB_STATEMENT_CACHE", 256))
+
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",      # durable at checkpoints; safe with WAL
+    "PRAGMA cache_size = -32000;",       # ~32 MB page cache per connection
+    "PRAGMA mmap_size = 268435456;",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA busy_timeout = 10000;",
+]
+
+
+# ==========================================================
+# STATEMENT TIMING
+# ==========================================================
+class TimedCursor(sqlite3.Cursor):
+    """
+    Records every execute on pooled connections (SMARTSHOP_METRICS /
+    SMARTSHOP_SLOW_QUERY_MS), including code that uses connect_db() directly.
+    Only the execute step is timed; the helpers below also time row fetching.
+    """
+
+    def _timed(self, op, run, sql, *args):
+        started = time.perf_counter()
+        try:
+            return run(sql, *args)
+        finally:
+            metrics.record_query(op, sql, started, max(self.rowcount, 0))
+
+    def execute(self, sql, parameters=()):
+        return self._timed("statement", super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed("statement_many", super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed("script", super().executescript, sql_script)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (and execute shortcuts) are TimedCursors."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+# ==========================================================
+# CONNECTION POOL
+# ==========================================================
+def open_connection(path):
+    """A WAL-mode connection with our pragmas; usable from any thread."""
+    conn = sqlite3.connect(
+        path,
+        check_same_thread=False,
+        timeout=10,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=TimedConnection if metrics.DB_TIMING else sqlite3.Connection,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of sqlite3 connections.
+    Connections are created lazily up to `size`; callers block when all are in use.
+    Each connection keeps its own prepared-statement cache, so reuse also
+    skips re-parsing the SQL for our fixed set of queries.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=30):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._connections = set()  # every open connection, idle or checked out
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._connections) < self.size:
+                conn = open_connection(self.path)
+                self._connections.add(conn)
+                return conn
+        return self._idle.get(timeout=self.timeout)
+
+    def release(self, conn):
+        with self._lock:
+            if conn not in self._connections:
+                return  # closed by close() while checked out
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit on success, roll back on error."""
+        conn = self.acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close every connection, including ones still checked out."""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+            self._idle = queue.LifoQueue()
+        for conn in connections:
+            conn.close()
+
+
+pool = ConnectionPool(DB_PATH)
+
+
+def connect_db():
+    return pool.connection()
+
+
+# ==========================================================
+# QUERY HELPERS
+# ==========================================================
+def query_db(query: str, params=None):
+    started = time.perf_counter() if metrics.DB_TIMING else None
+    try:
+        with connect_db() as conn:
+            df = pd.read_sql(query, conn, params=params or [])
+        if started is not None:
+            metrics.record_query("query", query, started, len(df))
+        return df
+    except Exception as e:
+        print("❌ Query Error:", e)
+        return pd.DataFrame()
+
+
+def query_rows(query: str, params=None):
+    """Rows as dicts straight from the cursor, without building a DataFrame."""
+    started = time.perf_counter() if metrics.DB_TIMING else None
+    try:
+        with connect_db() as conn:
+            cur = conn.execute(query, params or [])
+            columns = [c[0] for c in cur.description]
+            rows = [dict(zip(columns, row)) for row in cur]
+        if started is not None:
+            metrics.record_query("query", query, started, len(rows))
+        return rows
+    except Exception as e:
+        print("❌ Query Error:", e)
+        return []
+
+
+def iter_query(query: str, params=None, batch_size=500):
+    """
+    Yield (columns, rows) batches, holding one connection only while the
+    generator is alive. Memory stays at one batch regardless of result size,
+    which is what the streaming exports rely on. The connection is opened for
+    the stream rather than borrowed from the pool: an export lasts as long as
+    the client takes to read it, and slow clients must not starve the writer
+    and the other reads of pooled connections.
+    """
+    started = time.perf_counter() if metrics.DB_TIMING else None
+    total = 0
+    with closing(open_connection(pool.path)) as conn:
+        cur = conn.execute(query, params or [])
+        columns = [c[0] for c in cur.description]
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            total += len(rows)
+            yield columns, rows
+    if started is not None:
+        metrics.record_query("stream", query, started, total)
+
+
+def bump_data_version(cur):
+    """
+    Record a change that MAX(rowid) / MAX(ts) cannot see (repricing,
+    compaction, rebuilt tables). Call inside the writing transaction.
+    """
+    cur.execute("UPDATE data_version SET version = version + 1;")
+
+
+def get_data_version():
+    """
+    Cheap fingerprint of the data; changes whenever a row is added or a
+    writer bumps data_version. Separate subqueries keep each MAX an index
+    lookup instead of a scan.
+    """
+    try:
+        with connect_db() as conn:
+            row = conn.execute("""
+                SELECT (SELECT MAX(rowid) FROM my_table),
+                       (SELECT MAX(ts) FROM my_table),
+                       (SELECT version FROM data_version);
+            """).fetchone()
+        return "%s:%s:%s" % row
+    except Exception as e:
+        print("❌ Version Error:", e)
+        return None
+
+
+async def aquery_rows(query: str, params=None):
+    """query_rows on a worker thread, for async route handlers."""
+    return await asyncio.to_thread(query_rows, query, params)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking function that uses connect_db() on a worker thread."""
+    return await asyncio.to_thread(func, *args, **kwargs)
@@ -0,0 +1,213 @@
+# backend/events.py
+#
+# Live dashboard updates over Server-Sent Events. The writer thread hands
+# every group commit to one in-process DashboardBroadcaster, which numbers it
+# and fans the delta out to all subscribers from the event loop; no
+# subscriber queries SQLite per update.
+#
+# Handshake: a new client gets a `snapshot` event (inventory plus recent
+# sales) tagged with the current sequence number, then `delta` events. Event
+# ids are "<epoch>:<seq>", so a reconnecting EventSource sends Last-Event-ID
+# and has the deltas it missed replayed from a ring buffer; if they are gone
+# (or the server restarted) it gets a fresh snapshot instead. Deltas carry
+# absolute stock levels and row ids, so applying one twice is harmless.
+#
+# The broadcast is per process: with several API worker processes, each one
+# only sees the writes it committed itself.
+
+import asyncio
+import json
+import os
+import uuid
+from collections import deque
+from datetime import datetime
+
+EVENT_BUFFER = int(os.environ.get("SMARTSHOP_EVENT_BUFFER", 1000))
+SUBSCRIBER_QUEUE = int(os.environ.get("SMARTSHOP_EVENT_QUEUE", 256))
+SNAPSHOT_TRANSACTIONS = 100
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+
+
+def build_delta(applied):
+    """Writer results → {inventory: [{product, stock}], transactions: [...]} in commit order."""
+    stock = {}
+    transactions = []
+    for result in applied:
+        stock[result["product"]] = result["new_stock"]
+        if result["stock_sold"] > 0:
+            transactions.append({
+                "product": result["product"],
+                "quantity": result["stock_sold"],
+                "type": "Sale",
+                "date": datetime.strptime(result["date"], "%Y-%m-%d").strftime("%d-%m-%Y"),
+                "ts": result["ts"],
+                "id": result["id"],
+            })
+    return {
+        "inventory": [{"product": product, "stock": value} for product, value in stock.items()],
+        "transactions": transactions,
+    }
+
+
+def format_event(event_type, event_id, payload):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+class _Subscriber:
+    def __init__(self, size):
+        self.queue = asyncio.Queue(maxsize=size)
+
+
+class DashboardBroadcaster:
+    """
+    Sequenced fan-out of dashboard deltas. Everything except publish() runs
+    on the event loop, so sequence numbers, the replay buffer and the shared
+    dashboard state need no locking.
+    """
+
+    def __init__(self, load_state, buffer_size=EVENT_BUFFER, queue_size=SUBSCRIBER_QUEUE):
+        self.load_state = load_state
+        self.queue_size = queue_size
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self._buffer = deque(maxlen=buffer_size)
+        self._subscribers = set()
+        self._loop = None
+        self._load_lock = None
+        self._inventory = None
+        self._recent = deque(maxlen=SNAPSHOT_TRANSACTIONS)
+
+    def event_id(self, seq):
+        return f"{self.epoch}:{seq}"
+
+    # ------------------------------------------------------
+    # lifecycle
+    # ------------------------------------------------------
+    def bind(self, loop):
+        self._loop = loop
+        self._load_lock = asyncio.Lock()
+
+    def close(self):
+        """Stop publishing and end every open stream."""
+        self._loop = None
+        for subscriber in list(self._subscribers):
+            self._disconnect(subscriber)
+        self._inventory = None
+
+    # ------------------------------------------------------
+    # publishing
+    # ------------------------------------------------------
+    def publish(self, applied):
+        """Writer listener: called on the writer thread after each commit."""
+        loop = self._loop
+        if loop is None:
+            return
+        delta = build_delta(applied)
+        try:
+            loop.call_soon_threadsafe(self._dispatch, delta)
+        except RuntimeError:
+            pass  # loop already closed during shutdown
+
+    def _dispatch(self, delta):
+        self.seq += 1
+        event = {"seq": self.seq, **delta}
+        self._buffer.append(event)
+        self._apply(event)
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind; it reconnects and resumes from the buffer
+                self._disconnect(subscriber)
+
+    def _disconnect(self, subscriber):
+        self._subscribers.discard(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    # ------------------------------------------------------
+    # shared dashboard state (source of every snapshot)
+    # ------------------------------------------------------
+    def _apply(self, event):
+        if self._inventory is None:
+            return
+        for item in event["inventory"]:
+            row = self._inventory.get(item["product"])
+            if row is not None:
+                row["stock"] = item["stock"]
+        for transaction in event["transactions"]:
+            if not self._recent or transaction["id"] > self._recent[0]["id"]:
+                self._recent.appendleft(transaction)
+
+    async def _ensure_state(self):
+        async with self._load_lock:
+            if self._inventory is not None:
+                return
+            loaded_at = self.seq
+            inventory, recent = await asyncio.to_thread(self.load_state, SNAPSHOT_TRANSACTIONS)
+            self._inventory = {row["product"]: row for row in inventory}
+            self._recent = deque(recent, maxlen=SNAPSHOT_TRANSACTIONS)
+            # Commits that landed while we were reading may or may not be in
+            # the rows; re-applying them is idempotent
+            for event in self._buffer:
+                if event["seq"] > loaded_at:
+                    self._apply(event)
+
+    def snapshot(self, limit):
+        return {
+            "seq": self.seq,
+            "inventory": [dict(self._inventory[product]) for product in sorted(self._inventory)],
+            "transactions": list(self._recent)[:limit],
+        }
+
+    # ------------------------------------------------------
+    # subscribing
+    # ------------------------------------------------------
+    def _missed_since(self, last_event_id):
+        """Buffered events after last_event_id, or None when a snapshot is needed."""
+        try:
+            epoch, seq = last_event_id.rsplit(":", 1)
+            seq = int(seq)
+        except (AttributeError, ValueError):
+            return None
+        if epoch != self.epoch or seq > self.seq:
+            return None
+        oldest = self._buffer[0]["seq"] if self._buffer else self.seq + 1
+        if seq < oldest - 1:
+            return None
+        return [event for event in self._buffer if event["seq"] > seq]
+
+    async def stream(self, last_event_id=None, limit=20):
+        """SSE text for one client: snapshot or replay, then live deltas."""
+        subscriber = _Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            missed = self._missed_since(last_event_id) if last_event_id else None
+            if missed is None:
+                await self._ensure_state()
+                snapshot = self.snapshot(limit)
+                sent = snapshot["seq"]
+                yield format_event("snapshot", self.event_id(sent), snapshot)
+            else:
+                sent = int(last_event_id.rsplit(":", 1)[1])
+                for event in missed:
+                    sent = event["seq"]
+                    yield format_event("delta", self.event_id(sent), event)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    return
+                if event["seq"] <= sent:
+                    continue  # already covered by the snapshot or replay
+                sent = event["seq"]
+                yield format_event("delta", self.event_id(sent), event)
+        finally:
+            self._subscribers.discard(subscriber)
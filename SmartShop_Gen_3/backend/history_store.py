@@ -0,0 +1,398 @@
+# backend/history_store.py
+#
+# Long-lived columnar copy of the model history (the daily_sales rollup),
+# loaded once at startup and brought up to date before each read: new
+# product-days are appended and the current day's row is updated in place.
+# Catching up on read keeps the work off the writer thread, whose commits
+# every write request waits for.
+# Columns are plain NumPy arrays: products are integer codes into one shared
+# name list and dates are epoch days, so the models and repricing get
+# DataFrames that wrap these arrays instead of re-reading the table into
+# object-dtype columns on every request.
+#
+# With SMARTSHOP_HISTORY_MMAP=/some/dir the loaded columns are also written
+# there as .npy files and memory-mapped, so uvicorn workers started on the
+# same data share those pages (mapped copy-on-write, so in-place updates stay
+# private to the process). Days added afterwards live in a small per-process
+# tail; every worker catches up from SQLite before it reads.
+#
+# New my_table rows move daily_sales.last_rowid, but repricing (or a rebuild)
+# changes days in place and only bumps data_version, which can happen in
+# another worker. sync() checks that too and reloads when it has moved.
+
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from backend.db import connect_db
+
+HISTORY_MMAP_DIR = os.environ.get("SMARTSHOP_HISTORY_MMAP", "")
+LOAD_CHUNK_ROWS = 100_000
+
+MISSING_DAY = np.iinfo(np.int32).min
+TREND_LABELS = ["Decrease", "Increase", "Stable"]
+
+COLUMNS = {
+    "id": np.int64,                  # daily_sales.id
+    "last_rowid": np.int64,          # the day's newest my_table row
+    "product": np.int32,             # index into HistoryStore.products, -1 = none
+    "product_id": np.float64,        # NaN = NULL
+    "day": np.int32,                 # epoch day, MISSING_DAY = unparseable
+    "expiry_day": np.int32,
+    "stock_sold": np.int32,
+    "discount_percent": np.float32,  # NaN = NULL
+    "base_price": np.float64,
+    "sale_seq": np.int32,            # 0 = not a sale
+    "trend": np.int8,                # index into TREND_LABELS, -1 = not labelled
+}
+
+SOURCE_SQL = """
+    SELECT id, last_rowid, product_id, product_name, date_iso, expiry_iso,
+           stock_sold, discount_percent, base_price, sale_seq, trend
+    FROM daily_sales
+    WHERE last_rowid > ?
+    ORDER BY last_rowid
+"""
+
+# Read together, so a change made after this point always moves the version
+VERSION_SQL = """
+    SELECT (SELECT MAX(last_rowid) FROM daily_sales),
+           (SELECT version FROM data_version)
+"""
+
+
+def epoch_days(values):
+    """ISO date strings → int32 epoch days, MISSING_DAY where unparseable."""
+    dates = pd.to_datetime(pd.Series(values, dtype="object"), format="%Y-%m-%d", errors="coerce")
+    days = dates.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    days[dates.isna().to_numpy()] = MISSING_DAY
+    return days.astype(np.int32)
+
+
+def calendar_fields(days):
+    """Epoch days → (month, day_of_month, day_of_week) as floats, NaN where missing."""
+    valid = days != MISSING_DAY
+    dates = np.where(valid, days, 0).astype("datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    month = (months.astype(np.int64) % 12 + 1).astype(float)
+    day_of_month = ((dates - months).astype(np.int64) + 1).astype(float)
+    day_of_week = ((days.astype(np.int64) + 3) % 7).astype(float)  # 1970-01-01 was a Thursday
+    for field in (month, day_of_month, day_of_week):
+        field[~valid] = np.nan
+    return month, day_of_month, day_of_week
+
+
+def days_until(days, current_date):
+    """Epoch-day column minus current_date's day, NaN where missing."""
+    today = (pd.Timestamp(current_date).normalize() - pd.Timestamp(0)).days
+    return np.where(days == MISSING_DAY, np.nan, days.astype(np.int64) - today)
+
+
+class _Columns:
+    """Growable column arrays; appends are amortized O(1) per row."""
+
+    def __init__(self):
+        self.size = 0
+        self.arrays = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    def append(self, chunk):
+        count = len(chunk["id"])
+        needed = self.size + count
+        capacity = len(self.arrays["id"])
+        if needed > capacity:
+            capacity = max(needed, 2 * capacity, 1024)
+            for name, array in self.arrays.items():
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[:self.size] = array[:self.size]
+                self.arrays[name] = grown
+        for name, array in self.arrays.items():
+            array[self.size:needed] = chunk[name]
+        self.size = needed
+
+    def view(self, name):
+        return self.arrays[name][:self.size]
+
+
+class HistoryStore:
+    def __init__(self, mmap_dir=HISTORY_MMAP_DIR):
+        self.mmap_dir = mmap_dir
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.products = []
+        self._codes = {}
+        self._base = {}          # memory-mapped snapshot columns (mmap mode)
+        self._base_size = 0
+        self._tail = _Columns()  # everything else
+        self.last_rowid = 0      # newest my_table row folded in
+        self.data_version = None # data_version.version as of the last sync
+        self.loaded = False
+
+    @property
+    def size(self):
+        return self._base_size + self._tail.size
+
+    def column(self, name):
+        """One column across snapshot and tail (a view unless both are non-empty)."""
+        if not self._base_size:
+            return self._tail.view(name)
+        if not self._tail.size:
+            return self._base[name]
+        return np.concatenate([self._base[name], self._tail.view(name)])
+
+    def _write(self, name, positions, values):
+        """Overwrite rows of one column in place, across snapshot and tail."""
+        in_base = positions < self._base_size
+        if in_base.any():
+            self._base[name][positions[in_base]] = values[in_base]
+        if not in_base.all():
+            self._tail.arrays[name][positions[~in_base] - self._base_size] = values[~in_base]
+
+    # ------------------------------------------------------
+    # loading and appending
+    # ------------------------------------------------------
+    def _encode(self, chunk):
+        names = chunk["product_name"]
+        for name in names.dropna().unique():
+            if name not in self._codes:
+                self._codes[name] = len(self.products)
+                self.products.append(name)
+        trend = pd.Categorical(chunk["trend"], categories=TREND_LABELS).codes
+        return {
+            "id": chunk["id"].to_numpy(dtype=np.int64),
+            "last_rowid": chunk["last_rowid"].to_numpy(dtype=np.int64),
+            "product": names.map(self._codes).fillna(-1).to_numpy(dtype=np.int32),
+            "product_id": pd.to_numeric(chunk["product_id"], errors="coerce").to_numpy(dtype=np.float64),
+            "day": epoch_days(chunk["date_iso"]),
+            "expiry_day": epoch_days(chunk["expiry_iso"]),
+            "stock_sold": pd.to_numeric(chunk["stock_sold"], errors="coerce").fillna(0).to_numpy(dtype=np.int32),
+            "discount_percent": pd.to_numeric(chunk["discount_percent"], errors="coerce").to_numpy(dtype=np.float32),
+            "base_price": pd.to_numeric(chunk["base_price"], errors="coerce").to_numpy(dtype=np.float64),
+            "sale_seq": pd.to_numeric(chunk["sale_seq"], errors="coerce").fillna(0).to_numpy(dtype=np.int32),
+            "trend": trend.astype(np.int8),
+        }
+
+    def _apply(self, chunk):
+        """Update the days already held, append the rest. Returns how many were appended."""
+        ids = self.column("id")
+        positions = np.searchsorted(ids, chunk["id"])
+        held = positions < len(ids)
+        held[held] = ids[positions[held]] == chunk["id"][held]
+        if held.any():
+            for name in COLUMNS:
+                self._write(name, positions[held], chunk[name][held])
+        new = ~held
+        if new.any():
+            self._tail.append({name: values[new] for name, values in chunk.items()})
+        return int(new.sum())
+
+    def sync(self):
+        """Fold in days written or updated since the last sync. Returns how many days were added."""
+        with self._lock:
+            with connect_db() as conn:
+                newest, version = conn.execute(VERSION_SQL).fetchone()
+            if self.data_version is not None and version != self.data_version:
+                # Days changed in place without a new row (repricing, a rebuild)
+                size = self.size
+                self.load()
+                return max(self.size - size, 0)
+            self.data_version = version
+            if newest is None or newest <= self.last_rowid:
+                self.loaded = True
+                return 0
+            with connect_db() as conn:
+                # Range scan on the last_rowid index; a day's row keeps its
+                # id but moves to the end of this order each time it changes
+                chunks = [
+                    self._encode(chunk)
+                    for chunk in pd.read_sql(SOURCE_SQL, conn, params=[self.last_rowid], chunksize=LOAD_CHUNK_ROWS)
+                    if not chunk.empty
+                ]
+            if not chunks:
+                self.loaded = True
+                return 0
+            changed = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in COLUMNS}
+            self.last_rowid = int(changed["last_rowid"].max())
+            # Back into id order, which _apply (and the columns) rely on
+            order = np.argsort(changed["id"], kind="stable")
+            added = self._apply({name: values[order] for name, values in changed.items()})
+            self.loaded = True
+            return added
+
+    def load(self):
+        """(Re)load from SQLite, through the memory-mapped snapshot when configured."""
+        with self._lock:
+            self._reset()
+            if self.mmap_dir and self._map_snapshot():
+                self.sync()
+            else:
+                self.sync()
+                if self.mmap_dir:
+                    self._write_snapshot()
+                    self._map_snapshot()
+            print(f"✅ History store loaded → {self.size} product-days, {len(self.products)} products")
+            return self.size
+
+    # ------------------------------------------------------
+    # memory-mapped snapshot
+    # ------------------------------------------------------
+    def _snapshot_path(self, name):
+        return os.path.join(self.mmap_dir, f"{name}.npy")
+
+    def _meta_path(self):
+        return os.path.join(self.mmap_dir, "meta.json")
+
+    @staticmethod
+    def _fingerprint(last_rowid):
+        """
+        Cheap checksum of the daily_sales rows last touched at or before
+        last_rowid; changes on rebuilds, repricing and when one of those days
+        takes in a later sale.
+        """
+        with connect_db() as conn:
+            return list(conn.execute("""
+                SELECT COUNT(*), MAX(id), TOTAL(stock_sold), TOTAL(discount_percent), TOTAL(sale_seq)
+                FROM daily_sales
+                WHERE last_rowid <= ?;
+            """, (last_rowid,)).fetchone())
+
+    def _write_snapshot(self):
+        try:
+            os.makedirs(self.mmap_dir, exist_ok=True)
+            suffix = f".{os.getpid()}.tmp"
+            for name in COLUMNS:
+                path = self._snapshot_path(name)
+                with open(path + suffix, "wb") as f:
+                    np.save(f, self.column(name))
+                os.replace(path + suffix, path)
+            meta = {
+                "rows": self.size,
+                "last_rowid": self.last_rowid,
+                "fingerprint": self._fingerprint(self.last_rowid),
+                "products": self.products,
+            }
+            meta_path = self._meta_path()
+            with open(meta_path + suffix, "w") as f:
+                json.dump(meta, f)
+            os.replace(meta_path + suffix, meta_path)
+        except Exception as e:
+            print("❌ History snapshot write error:", e)
+
+    def _map_snapshot(self):
+        """Map a snapshot no day of which has changed since; False if there is none."""
+        try:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+            base = {name: np.load(self._snapshot_path(name), mmap_mode="c") for name in COLUMNS}
+            if any(len(array) != meta["rows"] for array in base.values()):
+                return False
+            if self._fingerprint(meta["last_rowid"]) != meta["fingerprint"]:
+                return False
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print("❌ History snapshot load error:", e)
+            return False
+
+        self._reset()
+        self.products = meta["products"]
+        self._codes = {name: code for code, name in enumerate(self.products)}
+        self._base, self._base_size = base, meta["rows"]
+        self.last_rowid = meta["last_rowid"]
+        self.loaded = True
+        return True
+
+    # ------------------------------------------------------
+    # readers
+    # ------------------------------------------------------
+    def _product_names(self, codes):
+        names = pd.Categorical.from_codes(codes, categories=self.products)
+        if self.products != sorted(self.products):
+            # Match .astype("category") so groupby order and product codes do not depend on load order
+            names = names.reorder_categories(sorted(self.products))
+        return names
+
+    def model_frame(self):
+        """
+        Current history in the daily_sales layout the models read
+        (backend.ml_model). Numeric columns wrap the store's arrays, so the
+        current day's row may move on under a frame that is kept around.
+        """
+        with self._lock:
+            self.sync()
+            day = self.column("day")
+            expiry_day = self.column("expiry_day")
+            month, day_of_month, day_of_week = calendar_fields(day)
+            known = (day != MISSING_DAY) & (expiry_day != MISSING_DAY)
+            days_to_expiry = np.where(
+                known, np.maximum(expiry_day.astype(np.int64) - day, 0), np.nan
+            )
+            return pd.DataFrame({
+                "id": self.column("id"),
+                "last_rowid": self.column("last_rowid"),
+                "product_id": self.column("product_id"),
+                "product_name": self._product_names(self.column("product")),
+                "month": month,
+                "day_of_month": day_of_month,
+                "day_of_week": day_of_week,
+                "days_to_expiry": days_to_expiry,
+                "stock_sold": self.column("stock_sold"),
+                "discount_percent": self.column("discount_percent"),
+                "base_price": self.column("base_price"),
+                "sale_seq": self.column("sale_seq"),
+                "trend": pd.Categorical.from_codes(self.column("trend"), categories=TREND_LABELS),
+            }, copy=False)
+
+    def latest_rows(self):
+        """
+        Each product's newest my_table row, by product name:
+        (last_rowids, names, base_prices, expiry_days).
+        """
+        with self._lock:
+            self.sync()
+            products = self.column("product")
+            last_rowid = self.column("last_rowid")
+            named = np.flatnonzero(products >= 0)
+            if not len(named):
+                return [], [], np.empty(0), np.empty(0, dtype=np.int32)
+            # Group by product, newest row last within each group
+            ordered = named[np.lexsort((last_rowid[named], products[named]))]
+            codes, counts = np.unique(products[ordered], return_counts=True)
+            latest = ordered[np.cumsum(counts) - 1]
+            order = np.argsort([self.products[code] for code in codes], kind="stable")
+            latest = latest[order]
+            return (
+                last_rowid[latest].tolist(),
+                [self.products[code] for code in codes[order]],
+                self.column("base_price")[latest],
+                self.column("expiry_day")[latest],
+            )
+
+    def update_discounts(self, last_rowids, discounts, data_version=None):
+        """
+        Mirror a repricing write to the days whose newest row is in last_rowids.
+        Rows the store does not hold (any more) are skipped. Returns how many
+        were updated. data_version is the version the write committed; when
+        the store was current just before it and every row matched, the store
+        counts as current again instead of reloading on the next sync.
+        """
+        with self._lock:
+            column = self.column("last_rowid")
+            if not len(column):
+                return 0
+            last_rowids = np.asarray(last_rowids, dtype=np.int64)
+            sorter = np.argsort(column, kind="stable")
+            found = np.minimum(np.searchsorted(column, last_rowids, sorter=sorter), len(column) - 1)
+            positions = sorter[found]
+            held = column[positions] == last_rowids
+            self._write("discount_percent", positions[held], np.asarray(discounts, dtype=np.float32)[held])
+            if held.all() and data_version is not None and self.data_version == data_version - 1:
+                self.data_version = data_version
+            return int(held.sum())
+
+
+history = HistoryStore()
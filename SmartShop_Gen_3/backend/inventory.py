@@ -0,0 +1,78 @@
+# backend/inventory.py
+#
+# The inventory table is the current-state snapshot of my_table: one row per
+# product holding its latest stock, expiry and price (base, plus the adjusted
+# price and discount from the last repricing). Writers update it in the
+# same transaction as the my_table insert, so readers never have to search the
+# transaction log for each product's latest row. last_date and updated_at use
+# the ISO-8601 forms (my_table.date_iso / my_table.ts).
+
+import sqlite3
+import sys
+
+
+def rebuild_inventory(conn):
+    """Recompute the whole snapshot from my_table (latest row = highest rowid)."""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM inventory;")
+    cur.execute("""
+        INSERT INTO inventory (
+            product_id, product_name, stock_sold_total, stock_left,
+            expiry_date, base_price, adjusted_price, discount_percent,
+            last_rowid, last_date, updated_at
+        )
+        SELECT p.product_id, m.product_name, p.sold, m.stock_left,
+               m.expiry_date, m.base_price, m.adjusted_price, m.discount_percent,
+               m.rowid, m.date_iso, m.ts
+        FROM (
+            SELECT product_name,
+                   MAX(product_id) AS product_id,
+                   COALESCE(SUM(stock_sold), 0) AS sold,
+                   MAX(rowid) AS last_rowid
+            FROM my_table
+            WHERE product_name IS NOT NULL
+            GROUP BY product_name
+        ) AS p
+        JOIN my_table AS m ON m.rowid = p.last_rowid;
+    """)
+    return cur.execute("SELECT COUNT(*) FROM inventory;").fetchone()[0]
+
+
+def get_product_state(cur, product):
+    """
+    Current (product_id, stock_left, base_price, expiry_date, adjusted_price,
+    discount_percent) or None.
+    """
+    cur.execute("""
+        SELECT product_id, stock_left, base_price, expiry_date, adjusted_price, discount_percent
+        FROM inventory
+        WHERE product_name = ?;
+    """, (product,))
+    return cur.fetchone()
+
+
+def apply_inventory_change(cur, product, new_stock, sold, last_rowid, last_date, updated_at):
+    """Move a product's snapshot forward after a my_table insert."""
+    cur.execute("""
+        UPDATE inventory
+        SET stock_left = ?,
+            stock_sold_total = stock_sold_total + ?,
+            last_rowid = ?,
+            last_date = ?,
+            updated_at = ?
+        WHERE product_name = ?;
+    """, (new_stock, sold, last_rowid, last_date, updated_at, product))
+
+
+if __name__ == "__main__":
+    # Usage: python -m backend.inventory [path/to/my_database.db]
+    from backend.db import DB_PATH
+    from backend.migrations import migrate
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+
+    with sqlite3.connect(db_path) as conn:
+        migrate(conn)
+        count = rebuild_inventory(conn)
+        conn.commit()
+    print(f"✅ Inventory rebuilt → {count} products")
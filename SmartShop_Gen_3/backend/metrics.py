@@ -0,0 +1,177 @@
+# backend/metrics.py
+#
+# Minimal in-process metrics with Prometheus text exposition, served at
+# /metrics. Everything is opt-in:
+#
+#   SMARTSHOP_METRICS=1            route latency, SQL timing and model timing
+#   SMARTSHOP_SLOW_QUERY_MS=200    log statements slower than 200 ms
+#
+# When both are unset the hooks reduce to a single boolean check.
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+ENABLED = os.environ.get("SMARTSHOP_METRICS", "0").lower() in ["1", "true", "yes", "on"]
+SLOW_QUERY_MS = float(os.environ.get("SMARTSHOP_SLOW_QUERY_MS", 0) or 0)
+DB_TIMING = ENABLED or SLOW_QUERY_MS > 0
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    escaped = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][index] += 1
+            series["sum"] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    labels = _format_labels(self.labelnames, key, [("le", le)])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series['sum']}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# ==========================================================
+# METRICS
+# ==========================================================
+http_request_duration = Histogram(
+    "smartshop_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ["method", "route", "status"],
+)
+db_query_duration = Histogram(
+    "smartshop_db_query_duration_seconds",
+    "SQLite statement latency.",
+    ["op"],
+)
+db_rows = Counter(
+    "smartshop_db_rows_total",
+    "Rows returned or written by SQLite statements.",
+    ["op"],
+)
+db_slow_queries = Counter(
+    "smartshop_db_slow_queries_total",
+    "Statements slower than SMARTSHOP_SLOW_QUERY_MS.",
+    ["op"],
+)
+model_stage_duration = Histogram(
+    "smartshop_model_stage_duration_seconds",
+    "Time spent building features, fitting and predicting, per product model.",
+    ["model", "stage"],
+)
+
+ALL_METRICS = [http_request_duration, db_query_duration, db_rows, db_slow_queries, model_stage_duration]
+
+
+def render():
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ==========================================================
+# HOOKS
+# ==========================================================
+def record_query(op, query, started, rows):
+    """Call after a statement that began at `started` (perf_counter) when DB_TIMING is on."""
+    elapsed = time.perf_counter() - started
+    if ENABLED:
+        db_query_duration.observe(elapsed, op=op)
+        db_rows.inc(rows, op=op)
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc(op=op)
+        statement = " ".join(str(query).split())
+        print(f"🐢 Slow {op} ({elapsed * 1000:.1f} ms, {rows} rows): {statement[:300]}")
+
+
+def record_model_stage(model, stage, seconds):
+    if ENABLED:
+        model_stage_duration.observe(seconds, model=model, stage=stage)
+
+
+class RequestTimingMiddleware:
+    """ASGI middleware recording per-route latency. Only installed when ENABLED."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route.path if route is not None else "unmatched",
+                status=status["code"],
+            )
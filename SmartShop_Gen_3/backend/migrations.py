@@ -0,0 +1,177 @@
+# backend/migrations.py
+#
+# Schema migrations for the SQLite database, tracked with PRAGMA user_version.
+# Each migration runs once, in order, inside its own transaction. Migrations
+# only change schema and stored columns; the derived tables (inventory
+# snapshot, daily sales) are rebuilt once afterwards so they always match
+# the latest schema.
+
+from backend.daily_sales import rebuild_daily_sales
+from backend.dates import to_iso_date, to_iso_timestamp
+from backend.db import bump_data_version
+from backend.inventory import rebuild_inventory
+
+ISO_DATES_BATCH = 10_000
+
+MY_TABLE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_my_table_product_ts ON my_table (product_name, ts);",
+    "CREATE INDEX IF NOT EXISTS idx_my_table_date ON my_table (date_iso);",
+    "CREATE INDEX IF NOT EXISTS idx_my_table_ts ON my_table (ts);",
+]
+
+
+def _inventory_snapshot(conn):
+    cur = conn.cursor()
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(inventory);")}
+    if not columns:
+        cur.execute("""
+            CREATE TABLE inventory (
+                product_id INTEGER PRIMARY KEY,
+                product_name TEXT,
+                stock_sold_total INTEGER DEFAULT 0,
+                stock_left INTEGER DEFAULT 0,
+                expiry_date TEXT,
+                base_price REAL DEFAULT 0
+            );
+        """)
+    for name, ddl in [
+        ("last_rowid", "INTEGER"),
+        ("last_date", "TEXT"),
+        ("updated_at", "TEXT"),
+    ]:
+        if name not in columns:
+            cur.execute(f"ALTER TABLE inventory ADD COLUMN {name} {ddl};")
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_product_name
+        ON inventory (product_name);
+    """)
+
+
+def _iso_dates(conn):
+    cur = conn.cursor()
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(my_table);")}
+    for name in ["date_iso", "expiry_iso", "ts"]:
+        if name not in columns:
+            cur.execute(f"ALTER TABLE my_table ADD COLUMN {name} TEXT;")
+
+    # Convert in rowid-ordered batches so memory stays at one batch
+    last_rowid = 0
+    while True:
+        rows = cur.execute("""
+            SELECT rowid, date, expiry_date, updated_at FROM my_table
+            WHERE rowid > ?
+            ORDER BY rowid
+            LIMIT ?;
+        """, (last_rowid, ISO_DATES_BATCH)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for rowid, date, expiry_date, updated_at in rows:
+            date_iso = to_iso_date(date)
+            ts = to_iso_timestamp(updated_at) or (date_iso and date_iso + " 00:00:00")
+            updates.append((date_iso, to_iso_date(expiry_date), ts, rowid))
+        cur.executemany(
+            "UPDATE my_table SET date_iso = ?, expiry_iso = ?, ts = ? WHERE rowid = ?;",
+            updates,
+        )
+        last_rowid = rows[-1][0]
+
+    for ddl in MY_TABLE_INDEXES:
+        cur.execute(ddl)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_inventory_last_date ON inventory (last_date);")
+
+
+def _daily_sales(conn):
+    cur = conn.cursor()
+
+    # VACUUM renumbers implicit rowids, and inventory, daily_sales and the
+    # transaction cursors all refer to them. An INTEGER PRIMARY KEY keeps them.
+    columns = cur.execute("PRAGMA table_info(my_table);").fetchall()
+    if not any(pk for *_, pk in columns):
+        quoted = ", ".join(f'"{name}"' for _, name, *_ in columns)
+        definitions = ", ".join(f'"{name}" {ctype}'.strip() for _, name, ctype, *_ in columns)
+        cur.execute(f"CREATE TABLE my_table_new (id INTEGER PRIMARY KEY, {definitions});")
+        cur.execute(f"INSERT INTO my_table_new (id, {quoted}) SELECT rowid, {quoted} FROM my_table;")
+        cur.execute("DROP TABLE my_table;")
+        cur.execute("ALTER TABLE my_table_new RENAME TO my_table;")
+        for ddl in MY_TABLE_INDEXES:
+            cur.execute(ddl)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS daily_sales (
+            id INTEGER PRIMARY KEY,
+            product_name TEXT NOT NULL,
+            date_iso TEXT,
+            product_id INTEGER,
+            stock_sold INTEGER NOT NULL DEFAULT 0,
+            stock_left INTEGER,
+            base_price REAL,
+            discount_percent REAL,
+            expiry_iso TEXT,
+            last_rowid INTEGER,
+            month INTEGER,
+            day_of_month INTEGER,
+            day_of_week INTEGER,
+            days_to_expiry INTEGER,
+            sale_seq INTEGER,
+            sales_diff REAL,
+            trend TEXT,
+            UNIQUE (product_name, date_iso)
+        );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_daily_sales_last_rowid ON daily_sales (last_rowid);")
+
+
+def _data_version(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+    cur.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);")
+
+
+def _inventory_prices(conn):
+    cur = conn.cursor()
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(inventory);")}
+    for name in ["adjusted_price", "discount_percent"]:
+        if name not in columns:
+            cur.execute(f"ALTER TABLE inventory ADD COLUMN {name} REAL;")
+
+
+MIGRATIONS = [
+    _inventory_snapshot,
+    _iso_dates,
+    _daily_sales,
+    _data_version,
+    _inventory_prices,
+]
+
+DERIVED_TABLES = [
+    rebuild_inventory,
+    rebuild_daily_sales,
+]
+
+
+def migrate(conn):
+    """Bring the database schema up to date. Returns the resulting version."""
+    version = conn.execute("PRAGMA user_version;").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        try:
+            conn.execute("BEGIN;")
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"✅ Migration {number} applied: {migration.__name__.strip('_')}")
+
+    if version < len(MIGRATIONS):
+        for rebuild in DERIVED_TABLES:
+            rebuild(conn)
+        bump_data_version(conn.cursor())
+        conn.commit()
+    return max(version, len(MIGRATIONS))
@@ -1,18 +1,53 @@
-from fastapi import FastAPI, Query, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Query, Body, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
-import sqlite3
+import asyncio
+import base64
+import csv
+import io
+import json
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from backend.ml_model import run_regression_model, run_classification_model
-from backend.pricing_engine import calculate_dynamic_price
+from backend.ml_model import forecast_from_models, classification_from_models
+from backend.model_registry import registry
+from backend import metrics
+from backend.pricing_engine import calculate_dynamic_price, prices_for_days_left
+from backend.result_cache import ResultCache
+from backend.transactions import writer, parse_line
+from backend.compaction import COMPACT_INTERVAL_HOURS, compact_periodically
+from backend.migrations import migrate
+from backend.dates import to_iso_date
+from backend.events import DashboardBroadcaster, SNAPSHOT_TRANSACTIONS
+from backend.history_store import history, days_until
+from backend.db import (
+    connect_db, query_rows, aquery_rows, iter_query, run_db, pool, get_data_version,
+    bump_data_version,
+)
 
 
 # ==========================================================
 # FASTAPI CONFIG
 # ==========================================================
-app = FastAPI(title="SmartShop ML API")
+@asynccontextmanager
+async def lifespan(app):
+    with connect_db() as conn:
+        migrate(conn)
+    history.load()
+    dashboard_events.bind(asyncio.get_running_loop())
+    writer.start()
+    compaction = None
+    if COMPACT_INTERVAL_HOURS > 0:
+        compaction = asyncio.create_task(compact_periodically(writer))
+    yield
+    if compaction is not None:
+        compaction.cancel()
+    writer.stop()
+    dashboard_events.close()
+    pool.close()
+
+
+app = FastAPI(title="SmartShop ML API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,180 +55,397 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+if metrics.ENABLED:
+    app.add_middleware(metrics.RequestTimingMiddleware)
+
 
 # ==========================================================
 # DATABASE
 # ==========================================================
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = r"C:\Users\anmol\OneDrive\Desktop\dbms\smart-shop\SmartShop_Gen_3\database\my_database.db"
+def normalize_date(date_str: str):
+    """Any accepted date input → ISO 'YYYY-MM-DD' (matches my_table.date_iso)."""
+    if not date_str:
+        return None
+    return to_iso_date(date_str)
 
 
-def connect_db():
-    return sqlite3.connect(DB_PATH, check_same_thread=False, timeout=10)
+def date_filters(column: str, date: str = None, start: str = None, end: str = None):
+    """
+    Build index-friendly predicates on an ISO date column.
+    `date` is an exact day; `start`/`end` form an inclusive range.
+    """
+    conditions, params = [], []
+    date, start, end = normalize_date(date), normalize_date(start), normalize_date(end)
+    if date:
+        conditions.append(f"{column} = ?")
+        params.append(date)
+    if start:
+        conditions.append(f"{column} >= ?")
+        params.append(start)
+    if end:
+        conditions.append(f"{column} <= ?")
+        params.append(end)
+    return conditions, params
 
 
-def query_db(query: str, params=None):
-    try:
-        with connect_db() as conn:
-            return pd.read_sql(query, conn, params=params or [])
-    except Exception as e:
-        print("❌ Query Error:", e)
-        return pd.DataFrame()
+# ==========================================================
+# RESULT CACHE
+# ==========================================================
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("SMARTSHOP_CACHE_SIZE", 32)),
+    ttl_seconds=float(os.environ.get("SMARTSHOP_CACHE_TTL", 300)),
+)
 
 
-def execute_db(query: str, params=None):
-    try:
-        with connect_db() as conn:
-            cur = conn.cursor()
-            cur.execute(query, params or [])
-            conn.commit()
-    except Exception as e:
-        print("❌ DB Write Error:", e)
-        raise
+writer.add_listener(lambda applied: result_cache.invalidate())
 
 
-def normalize_date(date_str: str):
-    if not date_str:
-        return None
-    try:
-        dt = pd.to_datetime(date_str, errors="coerce")
-        if pd.isna(dt):
-            dt = datetime.strptime(date_str, "%d-%m-%Y")
-        return dt.strftime("%d-%m-%Y")
-    except Exception:
-        return None
+def cached_response(request: Request, name: str, compute):
+    """Serve a cached ML result, honouring If-None-Match with a 304."""
+    version = get_data_version()
+    if version is None:
+        return JSONResponse({"error": "No data found."}, status_code=404)
+
+    entry = result_cache.get_or_compute((name, version), lambda: compute(version))
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache"}
+    if entry["status_code"] == 200 and request.headers.get("if-none-match") == entry["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=entry["body"],
+        status_code=entry["status_code"],
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 # ==========================================================
 # ML ROUTES
 # ==========================================================
+def compute_forecast(version):
+    models = registry.get("regression", version, load_frame=history.model_frame)
+    if models is None:
+        return 404, {"error": "No data found."}
+    return 200, {"forecast": forecast_from_models(models)}
+
+
+def compute_classification(version):
+    models = registry.get("classification", version, load_frame=history.model_frame)
+    if models is None:
+        return 404, {"error": "No data found."}
+    return 200, {"classification": classification_from_models(models)}
+
+
 @app.get("/predict/forecast")
-def forecast():
-    df = query_db("SELECT * FROM my_table")
-    if df.empty:
-        return JSONResponse({"error": "No data found."}, status_code=404)
-    return JSONResponse({"forecast": run_regression_model(df)})
+async def forecast(request: Request):
+    return await run_db(cached_response, request, "forecast", compute_forecast)
 
 
 @app.get("/predict/classify")
-def classify():
-    df = query_db("SELECT * FROM my_table")
-    if df.empty:
-        return JSONResponse({"error": "No data found."}, status_code=404)
-    return JSONResponse({"classification": run_classification_model(df)})
+async def classify(request: Request):
+    return await run_db(cached_response, request, "classify", compute_classification)
 
 
 # ==========================================================
 # DASHBOARD ROUTES
 # ==========================================================
 @app.get("/data/inventory")
-def get_inventory(date: str = Query(None)):
-    normalized_date = normalize_date(date)
-    params = [normalized_date] if normalized_date else []
+async def get_inventory(date: str = Query(None), start: str = Query(None), end: str = Query(None)):
+    conditions, params = date_filters("last_date", date, start, end)
 
     query = f"""
-        SELECT m.product_name AS product,
-               m.stock_left AS stock,
-               m.expiry_date,
-               m.base_price
-        FROM my_table AS m
-        WHERE m.rowid = (
-            SELECT rowid FROM my_table
-            WHERE product_name = m.product_name
-            ORDER BY COALESCE(updated_at, date) DESC
-            LIMIT 1
-        )
-        {"AND m.date = ?" if normalized_date else ""}
-        ORDER BY m.product_name ASC;
+        SELECT product_name AS product,
+               stock_left AS stock,
+               expiry_date,
+               base_price
+        FROM inventory
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY product_name ASC;
     """
 
-    df = query_db(query, params)
-    if df.empty:
+    rows = await aquery_rows(query, params)
+    if not rows:
         return JSONResponse({"error": "No inventory data found."}, status_code=404)
-    return JSONResponse(df.to_dict(orient="records"))
+    return JSONResponse(rows)
+
+TRANSACTION_EXPORT_FORMATS = ["json", "ndjson", "csv"]
+
+
+def encode_cursor(ts: str, rowid: int):
+    return base64.urlsafe_b64encode(f"{ts}|{rowid}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    """Opaque cursor → (ts, rowid); raises ValueError if malformed."""
+    ts, rowid = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+    return ts, int(rowid)
+
+
+def stream_transactions(query: str, params, fmt: str):
+    """Encode rows as NDJSON or CSV straight from the sqlite cursor."""
+    header_sent = False
+    for columns, rows in iter_query(query, params):
+        if fmt == "csv":
+            buffer = io.StringIO()
+            out = csv.writer(buffer)
+            if not header_sent:
+                out.writerow(columns)
+                header_sent = True
+            out.writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n" for row in rows
+            )
+
 
 @app.get("/data/transactions")
-def get_transactions(limit: int = Query(20), date: str = Query(None)):
-    normalized_date = normalize_date(date)
-    params = [normalized_date, limit] if normalized_date else [limit]
+async def get_transactions(
+    limit: int = Query(None, ge=1),
+    date: str = Query(None),
+    start: str = Query(None),
+    end: str = Query(None),
+    cursor: str = Query(None),
+    format: str = Query("json"),
+):
+    """
+    Sales, newest first, paged by keyset on (ts, rowid).
+    json: one page (default 20 rows); the X-Next-Cursor header continues it.
+    ndjson / csv: streamed export of every matching row (or `limit` rows).
+    """
+    if format not in TRANSACTION_EXPORT_FORMATS:
+        return JSONResponse({"error": f"Unsupported format '{format}'."}, status_code=400)
+
+    conditions, params = date_filters("date_iso", date, start, end)
+    if cursor:
+        try:
+            cursor_ts, cursor_rowid = decode_cursor(cursor)
+        except Exception:
+            return JSONResponse({"error": "Invalid cursor."}, status_code=400)
+        conditions.append("(ts, rowid) < (?, ?)")
+        params.extend([cursor_ts, cursor_rowid])
+
+    if format == "json" and limit is None:
+        limit = 20
+    page_size = limit
+    if format == "json":
+        limit += 1  # one extra row tells us whether there is a next page
+    if limit is not None:
+        params.append(limit)
 
     query = f"""
         SELECT 
             product_name AS product,
             stock_sold AS quantity,
             'Sale' AS type,
-            date
+            date,
+            ts,
+            rowid AS id
         FROM my_table
         WHERE stock_sold > 0
-        {"AND date = ?" if normalized_date else ""}
-        ORDER BY COALESCE(updated_at, date) DESC
-        LIMIT ?;
+        {"".join(" AND " + c for c in conditions)}
+        ORDER BY ts DESC, rowid DESC
+        {"LIMIT ?" if limit is not None else ""};
     """
-    df = query_db(query, params)
-    if df.empty:
+
+    if format != "json":
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        return StreamingResponse(stream_transactions(query, params, format), media_type=media_type)
+
+    rows = await aquery_rows(query, params)
+    if not rows:
         return JSONResponse({"error": "No transactions found."}, status_code=404)
-    return JSONResponse(df.to_dict(orient="records"))
+
+    headers = {}
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1]["ts"], rows[-1]["id"])
+    return JSONResponse(rows, headers=headers)
+
+# ==========================================================
+# LIVE UPDATES
+# ==========================================================
+def load_dashboard_state(transaction_limit):
+    """Inventory and newest sales, shaped like /data/inventory and /data/transactions."""
+    inventory = query_rows("""
+        SELECT product_name AS product,
+               stock_left AS stock,
+               expiry_date,
+               base_price
+        FROM inventory
+        ORDER BY product_name ASC;
+    """)
+    transactions = query_rows("""
+        SELECT product_name AS product,
+               stock_sold AS quantity,
+               'Sale' AS type,
+               date,
+               ts,
+               rowid AS id
+        FROM my_table
+        WHERE stock_sold > 0
+        ORDER BY ts DESC, rowid DESC
+        LIMIT ?;
+    """, [transaction_limit])
+    return inventory, transactions
+
+
+dashboard_events = DashboardBroadcaster(load_dashboard_state)
+writer.add_listener(dashboard_events.publish)
+
+
+@app.get("/events/dashboard")
+async def dashboard_stream(
+    request: Request,
+    limit: int = Query(20, ge=1, le=SNAPSHOT_TRANSACTIONS),
+    last_event_id: str = Query(None),
+):
+    """
+    Server-Sent Events: a `snapshot` of inventory and the newest `limit`
+    sales, then a `delta` per commit. Reconnects resume via Last-Event-ID.
+    """
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        dashboard_events.stream(resume_from, limit),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # ==========================================================
 # BUY / SELL ENDPOINTS
 # ==========================================================
 @app.post("/data/transaction")
-def handle_transaction(data: dict = Body(...)):
-    product = data.get("product")
-    quantity = int(data.get("quantity", 1))
-    tx_type = data.get("type", "").lower()
+async def handle_transaction(data: dict = Body(...)):
+    # Same validation as each line of the bulk endpoint
+    line = parse_line(data)
+    if line is None:
+        return JSONResponse({"error": "Invalid request body."}, status_code=400)
+    product = line[0]
 
-    if not product or tx_type not in ["buy", "sell"]:
+    try:
+        [result] = await asyncio.wrap_future(writer.submit([line]))
+    except Exception as e:
+        print("❌ Transaction error:", e)
+        return JSONResponse({"error": "Transaction failed."}, status_code=500)
+
+    if result["status"] != 200:
+        return JSONResponse({"error": result["error"]}, status_code=result["status"])
+    return JSONResponse({
+        "message": result["message"],
+        "product": product,
+        "new_stock": result["new_stock"]
+    })
+
+
+@app.post("/data/transactions/bulk")
+async def handle_bulk_transactions(data: dict = Body(...)):
+    """
+    Apply a batch of buy/sell lines in one transaction.
+    Body: {"lines": [{"product": ..., "quantity": ..., "type": "buy"|"sell"}, ...]}
+    Each line gets its own result; invalid or out-of-stock lines do not block the rest.
+    """
+    lines = data.get("lines")
+    if not isinstance(lines, list) or not lines:
         return JSONResponse({"error": "Invalid request body."}, status_code=400)
 
+    parsed = [parse_line(line) for line in lines]
+    valid = [line for line in parsed if line is not None]
+
     try:
+        applied = await asyncio.wrap_future(writer.submit(valid)) if valid else []
+    except Exception as e:
+        print("❌ Bulk transaction error:", e)
+        return JSONResponse({"error": "Transaction failed."}, status_code=500)
+
+    applied = iter(applied)
+    results = []
+    for raw, line in zip(lines, parsed):
+        if line is None:
+            product = raw.get("product") if isinstance(raw, dict) else None
+            results.append({"product": product, "status": 400, "error": "Invalid line."})
+        else:
+            results.append(next(applied))
+    succeeded = sum(1 for r in results if r["status"] == 200)
+    return JSONResponse({
+        "message": f"{succeeded} of {len(results)} lines applied.",
+        "applied": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    })
+
+
+# ==========================================================
+# PRICING ENDPOINTS
+# ==========================================================
+@app.post("/pricing/reprice")
+async def reprice_inventory(date: str = Query(None)):
+    """Reprice every product's current row in one vectorized pass and one write."""
+    # Same reading as normalize_date / the /data filters: dd-mm-YYYY or ISO
+    current_date = to_iso_date(date) if date else datetime.now()
+    if current_date is None:
+        return JSONResponse({"error": "Invalid date."}, status_code=400)
+
+    # On the writer thread, between group commits, so no sale can land between
+    # reading each product's newest row and writing its new price
+    return await asyncio.wrap_future(writer.submit_task(lambda: reprice_current_inventory(current_date)))
+
+
+def reprice_current_inventory(current_date):
+    try:
+        # Each product's current row comes from the history store, not a join over my_table
+        rowids, products, base_prices, expiry_days = history.latest_rows()
+        if not rowids:
+            return JSONResponse({"error": "No inventory data found."}, status_code=404)
+
+        adjusted, discounts = prices_for_days_left(base_prices, days_until(expiry_days, current_date))
+        adjusted = adjusted.round(2).tolist()
+        discounts = discounts.tolist()
+
         with connect_db() as conn:
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT stock_left, base_price, expiry_date
-                FROM my_table
-                WHERE product_name = ?
-                ORDER BY COALESCE(updated_at, date) DESC
-                LIMIT 1;
-            """, (product,))
-            row = cur.fetchone()
-            if not row:
-                return JSONResponse({"error": f"Product '{product}' not found."}, status_code=404)
-
-            stock_left, base_price, expiry_date = row
-            new_stock = stock_left + quantity if tx_type == "buy" else stock_left - quantity
-            if new_stock < 0:
-                return JSONResponse({"error": "Insufficient stock."}, status_code=400)
-
-            today = datetime.now().strftime("%d-%m-%Y")
-            now_ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # <-- ISO format
-
-            cur.execute("""
-                INSERT INTO my_table (product_name, stock_left, stock_sold, base_price, expiry_date, date, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?);
-            """, (
-                product,
-                new_stock,
-                quantity if tx_type == "sell" else 0,
-                base_price,
-                expiry_date,
-                today,
-                now_ts
-            ))
+            conn.executemany(
+                "UPDATE my_table SET adjusted_price = ?, discount_percent = ? WHERE rowid = ?;",
+                zip(adjusted, discounts, rowids),
+            )
+            # New rows copy these from inventory, so the prices carry forward
+            conn.executemany(
+                "UPDATE inventory SET adjusted_price = ?, discount_percent = ? WHERE product_name = ?;",
+                zip(adjusted, discounts, products),
+            )
+            conn.executemany(
+                "UPDATE daily_sales SET discount_percent = ? WHERE last_rowid = ?;",
+                zip(discounts, rowids),
+            )
+            bump_data_version(conn.cursor())
+            version = conn.execute("SELECT version FROM data_version;").fetchone()[0]
             conn.commit()
 
-        print(f"✅ {tx_type.upper()} OK → {product} now {new_stock}")
+        # Other workers' stores see the version move and reload
+        history.update_discounts(rowids, discounts, data_version=version)
+        result_cache.invalidate()
         return JSONResponse({
-            "message": f"{tx_type.capitalize()} transaction successful.",
-            "product": product,
-            "new_stock": new_stock
+            "message": "Repricing successful.",
+            "repriced": len(rowids),
+            "items": [
+                {"product": p, "adjusted_price": a, "discount_percent": d}
+                for p, a, d in zip(products, adjusted, discounts)
+            ],
         })
 
     except Exception as e:
-        print("❌ Transaction error:", e)
-        return JSONResponse({"error": "Transaction failed."}, status_code=500)
+        print("❌ Repricing error:", e)
+        return JSONResponse({"error": "Repricing failed."}, status_code=500)
+
+
+# ==========================================================
+# METRICS
+# ==========================================================
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format. Empty unless SMARTSHOP_METRICS=1."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 # ==========================================================
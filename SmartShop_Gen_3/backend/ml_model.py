@@ -1,54 +1,334 @@
+import copy
+import multiprocessing
+import os
+import threading
+import time
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
+from backend.dates import parse_dates
+from backend.metrics import record_model_stage
 
-def run_regression_model(df):
-    """Run regression model for sales forecasting per product."""
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["month"] = df["date"].dt.month
-    df["day_of_month"] = df["date"].dt.day
-    df["product_id_code"] = df["product_id"].astype("category").cat.codes
 
-    selected_date = datetime.now()
-    forecast_results = []
+# ==========================================================
+# TRAINING CONFIG
+# ==========================================================
+# per_product: one forest per SKU (original behaviour)
+# global:      one forest for all SKUs, product code as a feature
+# hybrid:      per-product forests where there is enough history, the global
+#              forest for the long tail of low-history SKUs
+TRAIN_MODES = ["per_product", "global", "hybrid"]
+TRAIN_MODE = os.environ.get("SMARTSHOP_TRAIN_MODE", "per_product")
+TRAIN_WORKERS = int(os.environ.get("SMARTSHOP_TRAIN_WORKERS", 1))
+TRAIN_N_JOBS = int(os.environ.get("SMARTSHOP_TRAIN_N_JOBS", 1))
+
+# Trees added to an existing per-product forecaster when new rows arrive.
+# Once a forest would exceed MAX_TREES it is refit from scratch. 0 = always refit.
+WARM_START_TREES = int(os.environ.get("SMARTSHOP_WARM_START_TREES", 10))
+REGRESSION_TREES = 50
+MAX_REGRESSION_TREES = 2 * REGRESSION_TREES
+
+REGRESSION_FEATURES = ["product_id_code", "month", "day_of_month"]
+CLASSIFICATION_FEATURES = ["month", "day_of_week", "discount_percent", "base_price", "days_to_expiry"]
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def _resolve(mode, n_workers, n_jobs):
+    mode = mode or TRAIN_MODE
+    if mode not in TRAIN_MODES:
+        raise ValueError(f"Unknown training mode '{mode}'. Expected one of {TRAIN_MODES}.")
+    return mode, n_workers or TRAIN_WORKERS, n_jobs or TRAIN_N_JOBS
+
+
+def _map_products(func, tasks, n_workers):
+    """Run func over per-product tasks, across a shared process pool when n_workers > 1."""
+    global _executor, _executor_workers
+    if n_workers <= 1 or len(tasks) <= 1:
+        return [func(task) for task in tasks]
+    with _executor_lock:
+        if _executor is None or _executor_workers != n_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # spawn, not fork: the API process is multi-threaded (db pool, writer)
+            _executor = ProcessPoolExecutor(
+                max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            _executor_workers = n_workers
+        executor = _executor
+    chunksize = max(1, len(tasks) // (n_workers * 4))
+    return list(executor.map(func, tasks, chunksize=chunksize))
+
+
+def _fingerprint(frame):
+    """
+    (row count, newest my_table row id) for a slice of the history; changes
+    when rows are appended or a day's daily_sales row takes in a new sale.
+    """
+    last_row = int(frame["last_rowid"].max()) if "last_rowid" in frame.columns and len(frame) else None
+    return (len(frame), last_row)
+
+
+def is_feature_frame(df):
+    """True for rows from the daily_sales rollup (backend.daily_sales)."""
+    return "sale_seq" in df.columns
+
+
+def category_codes(values):
+    """Codes over the sorted distinct values, as values.astype("category") gives for raw columns."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.cat.remove_unused_categories()
+        return values.cat.reorder_categories(sorted(values.cat.categories)).cat.codes
+    return values.astype("category").cat.codes
+
 
-    for prod in df["product_name"].unique():
-        prod_data = df[df["product_name"] == prod]
-        if len(prod_data) >= 5:
-            X = prod_data[["product_id_code", "month", "day_of_month"]]
-            y = prod_data["stock_sold"]
+def feature_dates(df, iso_col, legacy_col):
+    """Prefer the ISO column written by the date migration; fall back to legacy text."""
+    if iso_col in df.columns:
+        return pd.to_datetime(df[iso_col], format="%Y-%m-%d", errors="coerce")
+    return parse_dates(df[legacy_col])
+
+
+# ==========================================================
+# REGRESSION (SALES FORECAST)
+# ==========================================================
+def _fit_regressor(task):
+    """
+    Fit one product's forecaster. Top-level so it can run in a worker process.
+    With a previous model, new trees are grown on the current data (warm_start)
+    instead of refitting the whole forest. The previous model is copied first:
+    the artifact it belongs to may still be serving predictions.
+    """
+    prod, X, y, previous, warm_trees, n_jobs = task
+    if previous is not None and warm_trees > 0 and previous.n_estimators + warm_trees <= MAX_REGRESSION_TREES:
+        model = copy.deepcopy(previous)
+        model.set_params(warm_start=True, n_estimators=previous.n_estimators + warm_trees, n_jobs=n_jobs)
+    else:
+        model = RandomForestRegressor(n_estimators=REGRESSION_TREES, random_state=42, n_jobs=n_jobs)
+    started = time.perf_counter()
+    model.fit(X, y)
+    return prod, model, time.perf_counter() - started
 
-            model = RandomForestRegressor(n_estimators=50, random_state=42)
-            model.fit(X, y)
 
-            next_month = (selected_date.month % 12) + 1
-            pred = model.predict([[prod_data["product_id_code"].iloc[0], next_month, 15]])
+def prepare_regression_frame(df):
+    if not is_feature_frame(df):
+        df["date"] = feature_dates(df, "date_iso", "date")
+        df["month"] = df["date"].dt.month
+        df["day_of_month"] = df["date"].dt.day
+    df["product_id_code"] = category_codes(df["product_id"])
+    return df
 
-            forecast_results.append({
-                "product": prod,
-                "predicted_sales": int(pred[0] * 30)
-            })
 
+def fit_regression_models(df, mode=None, n_workers=None, n_jobs=None, previous=None):
+    """
+    Fit the forecasting models and return them as a picklable artifact.
+    With `previous` (an earlier artifact), products whose rows have not changed
+    keep their model and changed products are warm-started.
+    """
+    mode, n_workers, n_jobs = _resolve(mode, n_workers, n_jobs)
+    previous = previous if previous and previous.get("mode") == mode else {}
+    started = time.perf_counter()
+    df = prepare_regression_frame(df)
+    record_model_stage("regression", "features", time.perf_counter() - started)
+
+    # Group once instead of re-filtering the whole frame for every product
+    groups = list(df.groupby("product_name", sort=False))
+    products = dict(previous.get("products", {}))
+    if mode == "per_product":
+        order = [prod for prod, prod_data in groups if len(prod_data) >= 5]
+    else:
+        order = [prod for prod, _ in groups]
+
+    tasks, fingerprints = [], {}
+    if mode in ["per_product", "hybrid"]:
+        for prod, prod_data in groups:
+            if len(prod_data) < 5:
+                continue
+            fingerprints[prod] = _fingerprint(prod_data)
+            entry = products.get(prod)
+            if entry and entry["fingerprint"] == fingerprints[prod]:
+                continue
+            tasks.append((
+                prod,
+                prod_data[REGRESSION_FEATURES].to_numpy(dtype=float),
+                prod_data["stock_sold"].to_numpy(),
+                entry["model"] if entry else None,
+                WARM_START_TREES,
+                n_jobs,
+            ))
+        codes = {prod: prod_data["product_id_code"].iloc[0] for prod, prod_data in groups}
+        for prod, model, fit_seconds in _map_products(_fit_regressor, tasks, n_workers):
+            record_model_stage("regression", "fit", fit_seconds)
+            products[prod] = {"model": model, "code": codes[prod], "fingerprint": fingerprints[prod]}
+        products = {prod: products[prod] for prod in fingerprints}
+    else:
+        products = {}
+
+    global_entry = None
+    if mode == "global" or (mode == "hybrid" and any(prod not in products for prod in order)):
+        global_entry = previous.get("global")
+        fingerprint = _fingerprint(df)
+        if not global_entry or global_entry["fingerprint"] != fingerprint:
+            model = RandomForestRegressor(n_estimators=REGRESSION_TREES, random_state=42, n_jobs=n_jobs)
+            started = time.perf_counter()
+            model.fit(df[REGRESSION_FEATURES].to_numpy(dtype=float), df["stock_sold"].to_numpy())
+            record_model_stage("regression_global", "fit", time.perf_counter() - started)
+            global_entry = {"model": model, "fingerprint": fingerprint}
+        # A new dict, so the previous artifact's entry is left as it was
+        global_entry = dict(global_entry, codes={
+            prod: prod_data["product_id_code"].iloc[0] for prod, prod_data in groups
+        })
+
+    return {
+        "kind": "regression",
+        "mode": mode,
+        "order": order,
+        "products": products,
+        "global": global_entry,
+        "refit": [task[0] for task in tasks],
+    }
+
+
+def forecast_from_models(models, selected_date=None):
+    """Predict next month's sales for every product in a fitted artifact."""
+    selected_date = selected_date or datetime.now()
+    next_month = (selected_date.month % 12) + 1
+
+    forecast_results = []
+    for prod in models["order"]:
+        entry = models["products"].get(prod)
+        if entry is not None:
+            model, code = entry["model"], entry["code"]
+        else:
+            model, code = models["global"]["model"], models["global"]["codes"][prod]
+        started = time.perf_counter()
+        pred = model.predict(np.array([[code, next_month, 15]], dtype=float))
+        record_model_stage("regression", "predict", time.perf_counter() - started)
+        forecast_results.append({
+            "product": prod,
+            "predicted_sales": int(pred[0] * 30)
+        })
     return forecast_results
-import pandas as pd
-import numpy as np
-from datetime import datetime
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
 
 
-def run_classification_model(df):
+def run_regression_model(df, mode=None, n_workers=None, n_jobs=None):
     """
-    Predicts sales trend direction per product:
-    'Increase', 'Decrease', or 'Stable'
+    Run regression model for sales forecasting per product.
+    mode / n_workers / n_jobs default to the SMARTSHOP_TRAIN_* settings.
+    """
+    return forecast_from_models(fit_regression_models(df, mode, n_workers, n_jobs))
+
+
+# ==========================================================
+# CLASSIFICATION (SALES TREND)
+# ==========================================================
+def _label_trends(prod_df):
+    """Add the Increase/Decrease/Stable label from the day-over-day change in sales."""
+    if is_feature_frame(prod_df):
+        # Labelled when the row was written; the first sale has no previous diff
+        prod_df = prod_df.sort_values("sale_seq").reset_index(drop=True)
+        return prod_df[prod_df["sale_seq"] > 1]
+
+    prod_df = prod_df.sort_values("date").reset_index(drop=True)
+
+    # Compute trend label
+    prod_df["sales_diff"] = prod_df["stock_sold"].diff().fillna(0)
+    threshold = max(1, prod_df["stock_sold"].mean() * 0.05)  # 5% threshold
+    prod_df["trend"] = np.where(
+        prod_df["sales_diff"] > threshold, "Increase",
+        np.where(prod_df["sales_diff"] < -threshold, "Decrease", "Stable")
+    )
+
+    # Remove first row (no previous diff)
+    return prod_df.iloc[1:]
+
+
+def _importance_result(prod, acc, importances):
+    """Response entry for one product, plus its unrounded accuracy."""
+    importances = dict(importances)
+    top_feature = max(importances, key=importances.get)
+    return {
+        "product": prod,
+        "accuracy": round(acc, 3),
+        "top_feature": top_feature,
+        "feature_importance": importances,
+    }, acc
+
+
+def _fit_classifier(task):
+    """Fit one product's trend classifier. Top-level so it can run in a worker process."""
+    prod, X, y, n_jobs = task
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.3, random_state=42
+    )
+
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    fitted = time.perf_counter()
+
+    preds = model.predict(X_test)
+    timings = {"fit": fitted - started, "predict": time.perf_counter() - fitted}
+    acc = accuracy_score(y_test, preds)
+    result, acc = _importance_result(prod, acc, zip(X.columns, model.feature_importances_))
+    return prod, model, result, acc, timings
+
+
+def _global_classification(labelled, products, n_jobs):
+    """One classifier over every product's labelled rows, scored per product."""
+    data = pd.concat(labelled.values(), ignore_index=True)
+    feature_cols = CLASSIFICATION_FEATURES + ["product_code"]
+    X_train, X_test, y_train, y_test = train_test_split(
+        data[feature_cols], data["trend"], test_size=0.3, random_state=42
+    )
+
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    started = time.perf_counter()
+    model.fit(X_train, y_train)
+    record_model_stage("classification_global", "fit", time.perf_counter() - started)
+    importances = list(zip(feature_cols, model.feature_importances_))[:len(CLASSIFICATION_FEATURES)]
+
+    test_products = data.loc[X_test.index, "product_name"]
+    scores = {}
+    for prod in products:
+        mask = (test_products == prod).to_numpy()
+        if not mask.any():
+            continue
+        started = time.perf_counter()
+        preds = model.predict(X_test[mask])
+        record_model_stage("classification_global", "predict", time.perf_counter() - started)
+        acc = accuracy_score(y_test[mask], preds)
+        scores[prod] = _importance_result(prod, acc, importances)
+    return model, scores
+
+
+def _prepare_feature_rows(df):
     """
+    daily_sales rows (or a history_store frame): only the NULL fills and
+    the product codes are left to do, and only on the sales rows.
+    """
+    product_code = category_codes(df["product_name"]).to_numpy()
+    sales = (df["stock_sold"] > 0).to_numpy()
+    df = df[sales].assign(product_code=product_code[sales])
+    for col in ["month", "day_of_week", "days_to_expiry", "discount_percent", "base_price"]:
+        df[col] = df[col].fillna(0)
+    df["month"] = df["month"].astype(int)
+    df["day_of_week"] = df["day_of_week"].astype(int)
+    return df
+
+
+def prepare_classification_frame(df):
+    if is_feature_frame(df):
+        return _prepare_feature_rows(df)
 
     df = df.copy()
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["date"] = feature_dates(df, "date_iso", "date")
     df = df.sort_values("date")
 
     # Basic feature extraction
@@ -62,9 +342,9 @@ def run_classification_model(df):
         df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
 
     # Handle expiry date
-    if "expiry_date" in df.columns:
+    if "expiry_iso" in df.columns or "expiry_date" in df.columns:
         df["days_to_expiry"] = (
-            pd.to_datetime(df["expiry_date"], errors="coerce") - df["date"]
+            feature_dates(df, "expiry_iso", "expiry_date") - df["date"]
         ).dt.days.clip(lower=0).fillna(0)
     else:
         df["days_to_expiry"] = 0
@@ -72,64 +352,96 @@ def run_classification_model(df):
     df["product_code"] = df["product_name"].astype("category").cat.codes
 
     # Filter valid data
-    df = df[df["stock_sold"] > 0].copy()
-    if len(df) < 10:
-        return {"error": "Insufficient sales data for classification."}
-
-    results = []
-    accs = []
-
-    # Process per product
-    for prod, prod_df in df.groupby("product_name"):
-        if len(prod_df) < 5:
-            continue
+    return df[df["stock_sold"] > 0].copy()
 
-        prod_df = prod_df.sort_values("date").reset_index(drop=True)
 
-        # Compute trend label
-        prod_df["sales_diff"] = prod_df["stock_sold"].diff().fillna(0)
-        threshold = max(1, prod_df["stock_sold"].mean() * 0.05)  # 5% threshold
-        prod_df["trend"] = np.where(
-            prod_df["sales_diff"] > threshold, "Increase",
-            np.where(prod_df["sales_diff"] < -threshold, "Decrease", "Stable")
-        )
-
-        # Remove first row (no previous diff)
-        prod_df = prod_df.iloc[1:]
-
-        if prod_df["trend"].nunique() < 2:
-            continue
+def fit_classification_models(df, mode=None, n_workers=None, n_jobs=None, previous=None):
+    """
+    Fit the trend classifiers and return them as a picklable artifact.
+    With `previous`, only products whose rows changed are refit. Classifiers
+    are refit rather than warm-started so the train/test split and the
+    reported accuracy cover the product's whole history.
+    """
+    mode, n_workers, n_jobs = _resolve(mode, n_workers, n_jobs)
+    previous = previous if previous and previous.get("mode") == mode else {}
+    artifact = {"kind": "classification", "mode": mode, "order": [], "products": {},
+                "global": None, "refit": [], "error": None}
 
-        feature_cols = ["month", "day_of_week", "discount_percent", "base_price", "days_to_expiry"]
-        X = prod_df[feature_cols]
-        y = prod_df["trend"]
+    started = time.perf_counter()
+    df = prepare_classification_frame(df)
+    record_model_stage("classification", "features", time.perf_counter() - started)
+    if len(df) < 10:
+        artifact["error"] = "Insufficient sales data for classification."
+        return artifact
 
-        if len(X) < 6:
+    # Label every product once; products with enough rows and at least two
+    # distinct trends get their own model
+    labelled, fingerprints, eligible = {}, {}, []
+    for prod, prod_df in df.groupby("product_name"):
+        fingerprints[prod] = _fingerprint(prod_df)
+        started = time.perf_counter()
+        prod_df = _label_trends(prod_df)
+        record_model_stage("classification", "labels", time.perf_counter() - started)
+        if prod_df.empty:
             continue
+        labelled[prod] = prod_df
+        if len(prod_df) >= 6 and prod_df["trend"].nunique() >= 2:
+            eligible.append(prod)
+    artifact["order"] = list(labelled)
 
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.3, random_state=42
-        )
+    products = {}
+    if mode in ["per_product", "hybrid"]:
+        tasks = []
+        for prod in eligible:
+            entry = previous.get("products", {}).get(prod)
+            if entry and entry["fingerprint"] == fingerprints[prod]:
+                products[prod] = entry
+            else:
+                tasks.append((prod, labelled[prod][CLASSIFICATION_FEATURES], labelled[prod]["trend"], n_jobs))
+        for prod, model, result, acc, timings in _map_products(_fit_classifier, tasks, n_workers):
+            for stage, seconds in timings.items():
+                record_model_stage("classification", stage, seconds)
+            products[prod] = {"model": model, "fingerprint": fingerprints[prod], "result": result, "acc": acc}
+        artifact["refit"] = [task[0] for task in tasks]
+    artifact["products"] = products
 
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
-        model.fit(X_train, y_train)
+    if mode in ["global", "hybrid"] and labelled:
+        pending = [prod for prod in labelled if prod not in products]
+        if pending:
+            fingerprint = _fingerprint(df)
+            global_entry = previous.get("global")
+            if not global_entry or global_entry["fingerprint"] != fingerprint:
+                model, scores = _global_classification(labelled, pending, n_jobs)
+                global_entry = {"model": model, "fingerprint": fingerprint, "scores": scores}
+            artifact["global"] = global_entry
 
-        preds = model.predict(X_test)
-        acc = accuracy_score(y_test, preds)
-        accs.append(acc)
+    return artifact
 
-        importances = dict(zip(X.columns, model.feature_importances_))
-        top_feature = max(importances, key=importances.get)
 
-        results.append({
-            "product": prod,
-            "accuracy": round(acc, 3),
-            "top_feature": top_feature,
-            "feature_importance": importances,
-        })
+def classification_from_models(models):
+    """Build the /predict/classify payload from a fitted artifact."""
+    if models["error"]:
+        return {"error": models["error"]}
 
-    if not results:
+    fitted = []
+    for prod in models["order"]:
+        if prod in models["products"]:
+            entry = models["products"][prod]
+            fitted.append((entry["result"], entry["acc"]))
+        elif models["global"] and prod in models["global"]["scores"]:
+            fitted.append(models["global"]["scores"][prod])
+    if not fitted:
         return {"error": "No product had enough trend variation for classification."}
 
-    overall_accuracy = round(np.mean(accs), 3)
+    results = [result for result, _ in fitted]
+    overall_accuracy = round(np.mean([acc for _, acc in fitted]), 3)
     return {"overall_accuracy": overall_accuracy, "products": results}
+
+
+def run_classification_model(df, mode=None, n_workers=None, n_jobs=None):
+    """
+    Predicts sales trend direction per product:
+    'Increase', 'Decrease', or 'Stable'
+    mode / n_workers / n_jobs default to the SMARTSHOP_TRAIN_* settings.
+    """
+    return classification_from_models(fit_classification_models(df, mode, n_workers, n_jobs))
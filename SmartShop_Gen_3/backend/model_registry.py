@@ -0,0 +1,124 @@
+# backend/model_registry.py
+#
+# Persistent store for fitted models. Artifacts from backend.ml_model are kept
+# in memory per process and serialized to SMARTSHOP_MODEL_DIR, one file per
+# data snapshot, so a restarted or newly scaled-out worker loads the latest
+# models from disk instead of training from scratch. When the data moves on,
+# only the products with new rows are refit (or warm-started).
+
+import hashlib
+import os
+import threading
+
+import joblib
+
+from backend.db import PROJECT_DIR, query_db
+from backend.ml_model import TRAIN_MODE, fit_regression_models, fit_classification_models
+
+MODEL_DIR = os.environ.get("SMARTSHOP_MODEL_DIR", os.path.join(PROJECT_DIR, "models"))
+MODEL_KEEP = int(os.environ.get("SMARTSHOP_MODEL_KEEP", 3))
+
+FITTERS = {
+    "regression": fit_regression_models,
+    "classification": fit_classification_models,
+}
+
+
+def load_history_frame():
+    """
+    Per-product daily rollup with precomputed features (backend.daily_sales).
+    last_rowid is the day's newest my_table row, which the models use to
+    detect new sales.
+    """
+    return query_db("SELECT * FROM daily_sales ORDER BY id")
+
+
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, keep=MODEL_KEEP):
+        self.model_dir = model_dir
+        self.keep = keep
+        self._artifacts = {}
+        self._locks = {kind: threading.Lock() for kind in FITTERS}
+
+    # ------------------------------------------------------
+    # disk
+    # ------------------------------------------------------
+    def _pointer_path(self, kind):
+        return os.path.join(self.model_dir, f"{kind}-latest.txt")
+
+    def _artifact_path(self, kind, version):
+        digest = hashlib.sha1(version.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.model_dir, f"{kind}-{digest}.joblib")
+
+    def load(self, kind):
+        """Newest saved (version, artifact) for kind, or None."""
+        try:
+            with open(self._pointer_path(kind)) as f:
+                filename = f.read().strip()
+            saved = joblib.load(os.path.join(self.model_dir, filename))
+            return saved["version"], saved["artifact"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("❌ Model load error:", e)
+            return None
+
+    def save(self, kind, version, artifact):
+        try:
+            os.makedirs(self.model_dir, exist_ok=True)
+            path = self._artifact_path(kind, version)
+            joblib.dump({"version": version, "artifact": artifact}, path + ".tmp")
+            os.replace(path + ".tmp", path)
+
+            pointer = self._pointer_path(kind)
+            with open(pointer + ".tmp", "w") as f:
+                f.write(os.path.basename(path))
+            os.replace(pointer + ".tmp", pointer)
+            self._prune(kind)
+        except Exception as e:
+            print("❌ Model save error:", e)
+
+    def _prune(self, kind):
+        saved = [
+            os.path.join(self.model_dir, name)
+            for name in os.listdir(self.model_dir)
+            if name.startswith(f"{kind}-") and name.endswith(".joblib")
+        ]
+        saved.sort(key=os.path.getmtime, reverse=True)
+        for path in saved[self.keep:]:
+            os.remove(path)
+
+    # ------------------------------------------------------
+    # lookup
+    # ------------------------------------------------------
+    def get(self, kind, version, load_frame=load_history_frame,
+            mode=None, n_workers=None, n_jobs=None, full=False):
+        """
+        Fitted artifact for `kind` at data `version`.
+        Uses the in-memory copy, then disk; otherwise fits incrementally from
+        whichever earlier artifact is available (or from scratch with full=True).
+        Returns None when there is no data to train on.
+        """
+        mode = mode or TRAIN_MODE
+        with self._locks[kind]:
+            current = None if full else self._artifacts.get(kind)
+            if not full and (current is None or current[0] != version):
+                saved = self.load(kind)
+                if saved and (current is None or saved[0] == version):
+                    current = saved
+
+            if current and current[0] == version and current[1]["mode"] == mode:
+                self._artifacts[kind] = current
+                return current[1]
+
+            df = load_frame()
+            if df.empty:
+                return None
+            previous = current[1] if current else None
+            artifact = FITTERS[kind](df, mode, n_workers, n_jobs, previous=previous)
+            self._artifacts[kind] = (version, artifact)
+            self.save(kind, version, artifact)
+            return artifact
+
+
+registry = ModelRegistry()
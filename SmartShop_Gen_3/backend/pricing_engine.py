@@ -1,7 +1,22 @@
 # backend/pricing_engine.py
 
 from datetime import datetime
+import numpy as np
 import pandas as pd
+from backend.dates import parse_dates
+
+DEFAULT_BASE_PRICE = 10.0
+
+# (max days left, price multiplier, discount percent), checked in order.
+# Anything past the last tier is sold at full price.
+DISCOUNT_TIERS = [
+    (-1, 0.1, 90),
+    (2, 0.3, 70),
+    (5, 0.5, 50),
+    (10, 0.7, 30),
+    (15, 0.85, 15),
+]
+
 
 def calculate_dynamic_price(base_price, expiry_date, current_date):
     """
@@ -11,34 +26,50 @@ def calculate_dynamic_price(base_price, expiry_date, current_date):
     # Ensure base_price is a valid float
     try:
         if base_price is None or pd.isna(base_price):
-            base_price = 10.0  # default price fallback
+            base_price = DEFAULT_BASE_PRICE  # default price fallback
         else:
             base_price = float(base_price)
     except Exception:
-        base_price = 10.0
+        base_price = DEFAULT_BASE_PRICE
 
-    # Parse dates
-    try:
-        expiry = pd.to_datetime(expiry_date, errors="coerce")
-        current = pd.to_datetime(current_date, errors="coerce")
-    except Exception:
-        return base_price, 0
-
-    if pd.isna(expiry) or pd.isna(current):
-        return base_price, 0
-
-    days_left = (expiry - current).days
-
-    # Apply discount rules
-    if days_left < 0:
-        return base_price * 0.1, 90
-    elif days_left <= 2:
-        return base_price * 0.3, 70
-    elif days_left <= 5:
-        return base_price * 0.5, 50
-    elif days_left <= 10:
-        return base_price * 0.7, 30
-    elif days_left <= 15:
-        return base_price * 0.85, 15
-    else:
-        return base_price, 0
+    # Same date parsing and tiers as the batch version
+    adjusted, discount = prices_for_days_left([base_price], days_to_expiry([expiry_date], current_date))
+    return float(adjusted[0]), int(discount[0])
+
+
+def days_to_expiry(expiry_dates, current_date=None):
+    """
+    Whole days from current_date (default now) to each expiry date, counted
+    between calendar days. Dates are read like everywhere else (ISO or
+    legacy dd-mm-YYYY); NaN where either date is unparseable.
+    """
+    current = parse_dates([current_date if current_date is not None else datetime.now()]).iloc[0]
+    expiry = parse_dates(expiry_dates).dt.normalize()
+    return (expiry - current.normalize()).dt.days.to_numpy(dtype=float)
+
+
+def calculate_dynamic_prices(base_prices, expiry_dates, current_date=None):
+    """
+    Vectorized calculate_dynamic_price for a whole batch.
+    Returns (adjusted_prices, discount_percents) as NumPy arrays.
+    """
+    base = pd.to_numeric(pd.Series(base_prices, dtype="object"), errors="coerce")
+    base = base.fillna(DEFAULT_BASE_PRICE).to_numpy(dtype=float)
+
+    return prices_for_days_left(base, days_to_expiry(expiry_dates, current_date))
+
+
+def prices_for_days_left(base_prices, days_left):
+    """
+    Tier lookup on precomputed days to expiry (NaN = unknown, full price).
+    Returns (adjusted_prices, discount_percents) as NumPy arrays.
+    """
+    base = np.asarray(base_prices, dtype=float)
+    base = np.where(np.isnan(base), DEFAULT_BASE_PRICE, base)
+    days_left = np.asarray(days_left, dtype=float)
+
+    conditions = [days_left <= max_days for max_days, _, _ in DISCOUNT_TIERS]
+    multiplier = np.select(conditions, [m for _, m, _ in DISCOUNT_TIERS], default=1.0)
+    discount = np.select(conditions, [d for _, _, d in DISCOUNT_TIERS], default=0)
+
+    return base * multiplier, discount.astype(int)
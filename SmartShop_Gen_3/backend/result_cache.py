@@ -0,0 +1,86 @@
+# backend/result_cache.py
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Small LRU + TTL cache for serialized ML responses.
+
+    Entries are keyed on (name, data_version) so a new row in my_table, a
+    repricing or a compaction naturally misses. Values are stored already
+    JSON-encoded together with an ETag, which lets a hit (or a 304) skip
+    serialization entirely.
+    Concurrent misses for the same key wait on a per-key lock so the model
+    is only trained once.
+    """
+
+    def __init__(self, max_entries=32, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["created"] > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def _put(self, key, status_code, payload):
+        body = json.dumps(
+            payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+        entry = {
+            "body": body,
+            "status_code": status_code,
+            "etag": '"%s"' % hashlib.sha1(body).hexdigest(),
+            "created": time.monotonic(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached entry for key, calling compute() on a miss.
+        compute() must return (status_code, payload).
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another request may have filled the entry while we waited
+            entry = self.get(key)
+            if entry is not None:
+                return entry
+            try:
+                status_code, payload = compute()
+                return self._put(key, status_code, payload)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,60 @@
+# backend/train.py
+#
+# Offline training entry point. Precomputes the forecasting and trend models
+# for the current data snapshot and saves them to the model registry, so the
+# API serves them without training in the request path.
+#
+#   python -m backend.train                      # incremental, both model kinds
+#   python -m backend.train --full --workers 8   # retrain everything in parallel
+
+import argparse
+import time
+
+from backend.db import connect_db, get_data_version
+from backend.migrations import migrate
+from backend.ml_model import TRAIN_MODE, TRAIN_MODES
+from backend.model_registry import FITTERS, registry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train SmartShop models into the registry.")
+    parser.add_argument("--kind", choices=list(FITTERS) + ["all"], default="all")
+    parser.add_argument("--mode", choices=TRAIN_MODES, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="processes for per-product fits")
+    parser.add_argument("--n-jobs", type=int, default=None, help="n_jobs for each RandomForest")
+    parser.add_argument("--full", action="store_true", help="ignore saved models and refit everything")
+    args = parser.parse_args(argv)
+
+    with connect_db() as conn:
+        migrate(conn)
+
+    version = get_data_version()
+    if version is None:
+        print("❌ Could not read the database.")
+        return 1
+
+    kinds = list(FITTERS) if args.kind == "all" else [args.kind]
+    for kind in kinds:
+        saved = registry.load(kind)
+        if not args.full and saved and saved[0] == version and saved[1]["mode"] == (args.mode or TRAIN_MODE):
+            print(f"✅ {kind} models already up to date for this data snapshot.")
+            continue
+
+        start = time.perf_counter()
+        artifact = registry.get(
+            kind, version, mode=args.mode, n_workers=args.workers,
+            n_jobs=args.n_jobs, full=args.full,
+        )
+        elapsed = time.perf_counter() - start
+        if artifact is None:
+            print(f"❌ {kind}: no data found.")
+            return 1
+        print(
+            f"✅ {kind} ({artifact['mode']}) → {len(artifact['products'])} product models, "
+            f"{len(artifact['refit'])} refit in {elapsed:.2f}s"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
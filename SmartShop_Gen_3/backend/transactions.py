@@ -0,0 +1,272 @@
+# backend/transactions.py
+#
+# Buy/sell writes. Every write goes through a single GroupCommitWriter thread:
+# requests that arrive within a few milliseconds of each other are applied in
+# one BEGIN IMMEDIATE transaction and share one commit (one fsync), instead of
+# each request opening its own transaction and fighting over the write lock.
+
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from backend import metrics
+from backend.dates import to_iso_date
+from backend.db import connect_db
+from backend.daily_sales import record_daily_sales
+from backend.inventory import get_product_state, apply_inventory_change
+
+GROUP_COMMIT_MS = float(os.environ.get("SMARTSHOP_GROUP_COMMIT_MS", 5))
+GROUP_COMMIT_MAX_JOBS = int(os.environ.get("SMARTSHOP_GROUP_COMMIT_MAX_JOBS", 256))
+
+INSERT_SQL = """
+    INSERT INTO my_table (
+        product_id, product_name, stock_left, stock_sold, base_price, expiry_date,
+        adjusted_price, discount_percent, date, updated_at, date_iso, expiry_iso, ts
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+
+# ==========================================================
+# APPLYING LINES
+# ==========================================================
+def parse_line(data):
+    """Validate one {product, quantity, type} line → (product, quantity, tx_type) or None."""
+    if not isinstance(data, dict):
+        return None
+    product = data.get("product")
+    tx_type = str(data.get("type", "")).lower()
+    try:
+        quantity = int(data.get("quantity", 1))
+    except (TypeError, ValueError):
+        return None
+    if not product or tx_type not in ["buy", "sell"] or quantity < 1:
+        return None
+    return product, quantity, tx_type
+
+
+def apply_transaction_lines(cur, lines, now=None):
+    """
+    Apply (product, quantity, tx_type) lines in order inside the caller's
+    transaction. Stock is checked against the running total, so two sells in
+    one batch cannot both spend the same units. Returns one result per line.
+    """
+    now = now or datetime.now()
+    today = now.strftime("%d-%m-%Y")
+    today_iso = now.strftime("%Y-%m-%d")
+    now_ts = now.strftime("%Y-%m-%d %H:%M:%S")
+
+    state = {}
+    for product in {line[0] for line in lines}:
+        row = get_product_state(cur, product)
+        if row:
+            product_id, stock_left, base_price, expiry_date, adjusted_price, discount_percent = row
+            state[product] = {
+                "product_id": product_id,
+                "stock_left": stock_left,
+                "base_price": base_price,
+                "expiry_date": expiry_date,
+                "adjusted_price": adjusted_price,
+                "discount_percent": discount_percent,
+                "expiry_iso": to_iso_date(expiry_date),
+                "sold": 0,
+            }
+
+    results, inserts, applied = [], [], []
+    for product, quantity, tx_type in lines:
+        item = state.get(product)
+        if item is None:
+            results.append({"product": product, "status": 404, "error": f"Product '{product}' not found."})
+            continue
+
+        new_stock = item["stock_left"] + quantity if tx_type == "buy" else item["stock_left"] - quantity
+        if new_stock < 0:
+            results.append({"product": product, "status": 400, "error": "Insufficient stock."})
+            continue
+
+        sold = quantity if tx_type == "sell" else 0
+        item["stock_left"] = new_stock
+        item["sold"] += sold
+        inserts.append((
+            item["product_id"], product, new_stock, sold, item["base_price"], item["expiry_date"],
+            item["adjusted_price"], item["discount_percent"], today, now_ts, today_iso,
+            item["expiry_iso"], now_ts,
+        ))
+        applied.append({
+            "product": product,
+            "status": 200,
+            "type": tx_type,
+            "quantity": quantity,
+            "stock_sold": sold,
+            "new_stock": new_stock,
+            "date": today_iso,
+            "ts": now_ts,
+            "message": f"{tx_type.capitalize()} transaction successful.",
+        })
+        results.append(applied[-1])
+
+    if inserts:
+        before = cur.execute("SELECT COALESCE(MAX(rowid), 0) FROM my_table;").fetchone()[0]
+        cur.executemany(INSERT_SQL, inserts)
+        rowids = cur.execute(
+            "SELECT rowid FROM my_table WHERE rowid > ? ORDER BY rowid;", (before,)
+        ).fetchall()
+        last_rowids = {}
+        for (rowid,), result in zip(rowids, applied):
+            result["id"] = rowid
+            last_rowids[result["product"]] = rowid
+        for product, last_rowid in last_rowids.items():
+            item = state[product]
+            apply_inventory_change(
+                cur, product, item["stock_left"], item["sold"], last_rowid, today_iso, now_ts
+            )
+        record_daily_sales(cur, before)
+
+    return results
+
+
+# ==========================================================
+# GROUP-COMMIT WRITER
+# ==========================================================
+class _Task:
+    def __init__(self, func, future):
+        self.func = func
+        self.future = future
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread fed by a queue. Each job is a list of parsed lines and
+    gets its own SAVEPOINT, so one failing job does not undo the others that
+    share its commit. Listeners run after the commit with every applied line.
+    Maintenance tasks (compaction) run on the same thread between commits.
+    """
+
+    def __init__(self, window_ms=GROUP_COMMIT_MS, max_jobs=GROUP_COMMIT_MAX_JOBS):
+        self.window = window_ms / 1000.0
+        self.max_jobs = max_jobs
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, func):
+        self._listeners.append(func)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="smartshop-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+    def submit(self, lines):
+        """Queue parsed lines for the next group commit; returns a Future of the results."""
+        self.start()
+        future = concurrent.futures.Future()
+        self._queue.put((lines, future))
+        return future
+
+    def submit_task(self, func):
+        """Run func() on the writer thread after the pending commit; returns a Future of its result."""
+        self.start()
+        future = concurrent.futures.Future()
+        self._queue.put(_Task(func, future))
+        return future
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            job = self._queue.get()
+            if job is None:
+                break
+            if isinstance(job, _Task):
+                self._run_task(job)
+                continue
+            batch, task = [job], None
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_jobs:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                if isinstance(job, _Task):
+                    task = job
+                    break
+                batch.append(job)
+            self._commit(batch)
+            if task is not None:
+                self._run_task(task)
+
+    def _run_task(self, task):
+        try:
+            task.future.set_result(task.func())
+        except Exception as e:
+            print("❌ Writer task error:", e)
+            task.future.set_exception(e)
+
+    def _commit(self, batch):
+        outcomes = []
+        started = time.perf_counter() if metrics.DB_TIMING else None
+        try:
+            with connect_db() as conn:
+                cur = conn.cursor()
+                cur.execute("BEGIN IMMEDIATE;")
+                for lines, future in batch:
+                    cur.execute("SAVEPOINT job;")
+                    try:
+                        results = apply_transaction_lines(cur, lines)
+                        cur.execute("RELEASE job;")
+                        outcomes.append((future, results, None))
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO job;")
+                        cur.execute("RELEASE job;")
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            print("❌ Group commit error:", e)
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        if started is not None:
+            lines = sum(len(lines) for lines, _ in batch)
+            metrics.record_query("group_commit", f"group commit of {len(batch)} requests", started, lines)
+
+        applied = [
+            result
+            for _, results, _ in outcomes if results
+            for result in results if result["status"] == 200
+        ]
+        if applied:
+            for result in applied:
+                print(f"✅ {result['type'].upper()} OK → {result['product']} now {result['new_stock']}")
+            for listener in self._listeners:
+                try:
+                    listener(applied)
+                except Exception as e:
+                    print("❌ Writer listener error:", e)
+
+        for future, results, error in outcomes:
+            if error is not None:
+                print("❌ Transaction error:", error)
+                future.set_exception(error)
+            else:
+                future.set_result(results)
+
+
+writer = GroupCommitWriter()
@@ -0,0 +1,130 @@
+# bench/generate_data.py
+#
+# Synthetic my_table histories for load testing. Rows use the same legacy
+# layout the shop writes (dd-mm-YYYY text dates, one row per product per day
+# with stock_sold / stock_left snapshots), then the normal migrations run so
+# the result looks like a production database.
+#
+#   python -m bench.generate_data bench/bench.db --products 10000 --days 1095
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from backend.migrations import migrate
+
+CREATE_MY_TABLE = """
+    CREATE TABLE my_table (
+        product_id INTEGER,
+        product_name TEXT,
+        date TEXT,
+        day TEXT,
+        stock_sold INTEGER,
+        stock_left INTEGER,
+        expiry_date TEXT,
+        base_price REAL,
+        adjusted_price REAL,
+        discount_percent INTEGER,
+        updated_at TEXT
+    );
+"""
+
+CATEGORIES = [
+    "Rice", "Sugar", "Wheat", "Oil", "Milk", "Salt", "Dal", "Tea", "Coffee", "Flour",
+    "Butter", "Cheese", "Yogurt", "Eggs", "Bread", "Pasta", "Noodles", "Jam", "Honey", "Biscuits",
+]
+
+
+def generate(path, products=1000, days=365, density=1.0, start="2023-01-01", seed=42, batch_size=50000):
+    """
+    Write a fresh database at `path`. `density` is the chance a product has a
+    row on a given day, so long-tail SKUs end up with sparse histories.
+    Returns the number of rows written.
+    """
+    rng = np.random.default_rng(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    names = np.array([f"{CATEGORIES[i % len(CATEGORIES)]} {i // len(CATEGORIES) + 1}" for i in range(products)])
+    ids = np.arange(1000, 1000 + products)
+    base_price = np.round(rng.uniform(10, 500, products), 2)
+    mean_sales = rng.gamma(2.0, 10.0, products)                 # popular vs long-tail SKUs
+    shelf_life = rng.integers(5, 365, products)                  # days until a batch expires
+    season_phase = rng.uniform(0, 2 * np.pi, products)
+    product_density = np.clip(rng.beta(2, 2, products) * 2 * density, 0.02, 1.0)
+
+    stock = rng.integers(50, 300, products)
+    expiry_day = rng.integers(0, 30, products) + shelf_life
+    start_date = datetime.strptime(start, "%Y-%m-%d")
+    updated_at = datetime.now().strftime("%d-%m-%Y %H:%M:%S")
+
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_MY_TABLE)
+    written, pending = 0, []
+    for day in range(days):
+        current = start_date + timedelta(days=day)
+        date_text = current.strftime("%d-%m-%Y")
+        weekday = current.strftime("%A")
+
+        season = 1 + 0.3 * np.sin(2 * np.pi * day / 365 + season_phase)
+        weekend = 1.25 if current.weekday() >= 5 else 1.0
+        sold = np.minimum(rng.poisson(mean_sales * season * weekend), stock)
+        stock = stock - sold
+
+        # Restock low SKUs with a fresh batch and a new expiry date
+        restock = stock < mean_sales * 3
+        stock = np.where(restock, stock + rng.integers(100, 400, products), stock)
+        expiry_day = np.where(restock, day + shelf_life, expiry_day)
+
+        active = np.flatnonzero(rng.random(products) < product_density)
+        for i in active:
+            expiry = (start_date + timedelta(days=int(expiry_day[i]))).strftime("%d-%m-%Y")
+            pending.append((
+                int(ids[i]), names[i], date_text, weekday, int(sold[i]), int(stock[i]),
+                expiry, float(base_price[i]), None, None, updated_at,
+            ))
+
+        if len(pending) >= batch_size or day == days - 1:
+            conn.executemany("INSERT INTO my_table VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);", pending)
+            conn.commit()
+            written += len(pending)
+            pending = []
+
+    conn.execute("""
+        CREATE TABLE inventory (
+            product_id INTEGER PRIMARY KEY,
+            product_name TEXT,
+            stock_sold_total INTEGER DEFAULT 0,
+            stock_left INTEGER DEFAULT 0,
+            expiry_date TEXT,
+            base_price REAL DEFAULT 0
+        );
+    """)
+    conn.commit()
+    migrate(conn)
+    conn.close()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic SmartShop database.")
+    parser.add_argument("path", help="output .db file (overwritten)")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--density", type=float, default=1.0, help="average share of products with a row per day")
+    parser.add_argument("--start", default="2023-01-01", help="first day, YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    began = time.perf_counter()
+    rows = generate(args.path, args.products, args.days, args.density, args.start, args.seed)
+    print(f"✅ {rows} rows for {args.products} products over {args.days} days "
+          f"→ {args.path} ({time.perf_counter() - began:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
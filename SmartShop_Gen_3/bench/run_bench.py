@@ -0,0 +1,209 @@
+# bench/run_bench.py
+#
+# Latency / throughput / memory benchmarks for the API and the model code.
+# Point it at a generated database (bench.generate_data); the transaction
+# scenario writes to it. Results are printed and written as JSON so runs can
+# be compared across commits.
+#
+#   python -m bench.generate_data bench/bench.db --products 2000 --days 730
+#   python -m bench.run_bench bench/bench.db --iterations 20 --output bench/results.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+
+def percentile_summary(latencies, total_seconds):
+    latencies = np.array(latencies) * 1000.0
+    return {
+        "iterations": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "throughput_per_s": round(len(latencies) / total_seconds, 3) if total_seconds else None,
+    }
+
+
+def measure(name, func, iterations, setup=None):
+    """Time `func` over `iterations` runs, then one extra traced run for peak memory."""
+    latencies = []
+    began = time.perf_counter()
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    total = time.perf_counter() - began
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = percentile_summary(latencies, total)
+    result["peak_memory_mb"] = round(peak / 1024 / 1024, 3)
+    print(f"  {name:<32} p50 {result['p50_ms']:>10.2f} ms   p95 {result['p95_ms']:>10.2f} ms   "
+          f"p99 {result['p99_ms']:>10.2f} ms   peak {result['peak_memory_mb']:>8.2f} MB")
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def run(db_path, iterations, model_iterations, skip_models=False):
+    # The backend reads its configuration at import time
+    model_dir = tempfile.mkdtemp(prefix="smartshop-bench-models-")
+    os.environ["SMARTSHOP_DB_PATH"] = os.path.abspath(db_path)
+    os.environ["SMARTSHOP_MODEL_DIR"] = model_dir
+
+    from fastapi.testclient import TestClient
+    from backend import ml_api
+    from backend.db import query_db
+    from backend.history_store import history as history_store
+    from backend.ml_model import run_regression_model, run_classification_model
+    from backend.model_registry import registry, load_history_frame
+    from backend.pricing_engine import calculate_dynamic_price, calculate_dynamic_prices
+
+    results = {}
+    try:
+        with TestClient(ml_api.app) as client:
+            products = [row["product"] for row in client.get("/data/inventory").json()]
+            rng = random.Random(42)
+
+            def expect_ok(response):
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{response.request.url} → {response.status_code}: {response.text[:200]}")
+
+            def transaction():
+                tx_type = rng.choice(["buy", "sell"])
+                response = client.post("/data/transaction", json={
+                    "product": rng.choice(products), "quantity": 1, "type": tx_type,
+                })
+                if response.status_code not in (200, 400):  # 400 = out of stock
+                    expect_ok(response)
+
+            def cold_models():
+                ml_api.result_cache.invalidate()
+                registry._artifacts.clear()
+                shutil.rmtree(model_dir, ignore_errors=True)
+
+            print("API")
+            results["GET /data/inventory"] = measure(
+                "GET /data/inventory", lambda: expect_ok(client.get("/data/inventory")), iterations)
+            results["GET /data/transactions"] = measure(
+                "GET /data/transactions", lambda: expect_ok(client.get("/data/transactions?limit=20")), iterations)
+            results["POST /data/transaction"] = measure(
+                "POST /data/transaction", transaction, iterations)
+
+            if not skip_models:
+                for route in ["/predict/forecast", "/predict/classify"]:
+                    results[f"GET {route} (cold)"] = measure(
+                        f"GET {route} (cold)", lambda: expect_ok(client.get(route)),
+                        model_iterations, setup=cold_models)
+                    results[f"GET {route} (cached)"] = measure(
+                        f"GET {route} (cached)", lambda: expect_ok(client.get(route)), iterations)
+
+        history = load_history_frame()
+        inventory = query_db("SELECT base_price, expiry_date FROM inventory")
+        today = datetime.now()
+
+        print("Direct")
+        results["load_history_frame (SQL)"] = measure(
+            "load_history_frame (SQL)", load_history_frame, max(1, iterations // 10))
+        results["history_store.model_frame"] = measure(
+            "history_store.model_frame", history_store.model_frame, iterations)
+        if not skip_models:
+            results["run_regression_model"] = measure(
+                "run_regression_model", lambda: run_regression_model(history.copy()), model_iterations)
+            results["run_classification_model"] = measure(
+                "run_classification_model", lambda: run_classification_model(history), model_iterations)
+
+        def scalar_pricing():
+            return [
+                calculate_dynamic_price(base_price, expiry_date, today)
+                for base_price, expiry_date in zip(inventory["base_price"], inventory["expiry_date"])
+            ]
+
+        # Only worth comparing if both give the same prices
+        _, batch_discounts = calculate_dynamic_prices(inventory["base_price"], inventory["expiry_date"], today)
+        if [discount for _, discount in scalar_pricing()] != batch_discounts.tolist():
+            raise RuntimeError("calculate_dynamic_price and calculate_dynamic_prices disagree")
+
+        results["calculate_dynamic_price (per item)"] = measure(
+            "calculate_dynamic_price (loop)", scalar_pricing, max(1, iterations // 10))
+        results["calculate_dynamic_prices (batch)"] = measure(
+            "calculate_dynamic_prices (batch)",
+            lambda: calculate_dynamic_prices(inventory["base_price"], inventory["expiry_date"], today),
+            iterations)
+
+        meta = {
+            "rows": int(len(history)),
+            "products": int(history["product_name"].nunique()) if len(history) else 0,
+        }
+    finally:
+        shutil.rmtree(model_dir, ignore_errors=True)
+
+    return meta, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SmartShop API and models.")
+    parser.add_argument("db", help="database to benchmark against (will be written to)")
+    parser.add_argument("--iterations", type=int, default=50, help="runs per API/pricing scenario")
+    parser.add_argument("--model-iterations", type=int, default=3, help="runs per model-training scenario")
+    parser.add_argument("--skip-models", action="store_true", help="skip the training benchmarks")
+    parser.add_argument("--output", help="write JSON results here (default: stdout only)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"❌ {args.db} not found. Generate one with: python -m bench.generate_data {args.db}")
+        return 1
+
+    meta, results = run(args.db, args.iterations, args.model_iterations, args.skip_models)
+    report = {
+        "meta": {
+            **meta,
+            "db": args.db,
+            "git_revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": args.iterations,
+            "model_iterations": args.model_iterations,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -43,10 +43,27 @@ const Dashboard = () => {
     }
   };
 
+  // Deltas carry absolute stock levels and row ids, so re-applying one is harmless
+  const applyDelta = (delta) => {
+    const stock = Object.fromEntries(delta.inventory.map((item) => [item.product, item.stock]));
+    setInventory((prev) =>
+      prev.map((item) => (item.product in stock ? { ...item, stock: stock[item.product] } : item))
+    );
+
+    const incoming = delta.transactions
+      .filter((t) => !dateFilter || t.date === dateFilter)
+      .reverse();
+    if (incoming.length === 0) return;
+    setTransactions((prev) => {
+      const seen = new Set(prev.map((t) => t.id));
+      return [...incoming.filter((t) => !seen.has(t.id)), ...prev].slice(0, limit);
+    });
+  };
+
   const handleTransaction = async (product, quantity, type) => {
     try {
+      // The dashboard stream delivers the resulting update; no refetch needed
       await axios.post(`${BASE_URL}/data/transaction`, { product, quantity, type });
-      fetchData();
     } catch (err) {
       console.error("Transaction failed:", err);
       setError("Transaction update failed.");
@@ -54,7 +71,29 @@ const Dashboard = () => {
   };
 
   useEffect(() => {
-    fetchData();
+    // Filtered views load once over HTTP; the unfiltered view uses the stream's snapshot
+    if (dateFilter) fetchData();
+    else setLoading(true);
+
+    const source = new EventSource(`${BASE_URL}/events/dashboard?limit=${limit}`);
+    source.addEventListener("snapshot", (e) => {
+      if (dateFilter) return;
+      const snapshot = JSON.parse(e.data);
+      setInventory(snapshot.inventory);
+      setTransactions(snapshot.transactions);
+      setError("");
+      setLoading(false);
+    });
+    source.addEventListener("delta", (e) => applyDelta(JSON.parse(e.data)));
+    source.onerror = () => {
+      // EventSource reconnects on its own (resuming via Last-Event-ID) unless closed
+      if (source.readyState === EventSource.CLOSED) {
+        setError("Live updates disconnected.");
+        setLoading(false);
+      }
+    };
+
+    return () => source.close();
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [limit, dateFilter]);
 
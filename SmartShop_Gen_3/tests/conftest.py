@@ -0,0 +1,59 @@
+import random
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+from backend import db
+from backend.migrations import migrate
+
+PRODUCTS = [(101, "Rice"), (102, "Sugar"), (103, "Milk")]
+START = date(2025, 1, 1)
+DAYS = 20
+
+
+def _legacy_rows(seed=0):
+    """my_table rows in the original dd-mm-YYYY layout: several buy/sell events per product-day."""
+    rng = random.Random(seed)
+    rows = []
+    for product_id, name in PRODUCTS:
+        stock = 500
+        expiry = (START + timedelta(days=rng.randint(10, 40))).strftime("%d-%m-%Y")
+        for offset in range(DAYS):
+            day = START + timedelta(days=offset)
+            for event in range(rng.randint(1, 4)):
+                sold = rng.choice([0, 0, 1, 2, 5, 9])
+                stock = stock - sold if sold else stock + 10
+                rows.append((
+                    product_id, name, day.strftime("%d-%m-%Y"), day.strftime("%A"), sold, stock,
+                    expiry, 10.0, None, None, f"{day.strftime('%d-%m-%Y')} 1{event}:00:00",
+                ))
+    rng.shuffle(rows)  # interleave products like real traffic
+    return sorted(rows, key=lambda row: (row[2][6:], row[2][3:5], row[2][:2], row[10]))
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    """A migrated database built from legacy-format rows."""
+    conn = sqlite3.connect(tmp_path / "smartshop.db")
+    conn.execute("""
+        CREATE TABLE my_table (
+            product_id INTEGER, product_name TEXT, date TEXT, day TEXT,
+            stock_sold INTEGER, stock_left INTEGER, expiry_date TEXT,
+            base_price REAL, adjusted_price REAL, discount_percent INTEGER, updated_at TEXT
+        );
+    """)
+    conn.executemany("INSERT INTO my_table VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);", _legacy_rows())
+    conn.commit()
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def pooled_db(legacy_db, tmp_path, monkeypatch):
+    """legacy_db, also behind the connection pool that connect_db() and the writer use."""
+    pool = db.ConnectionPool(str(tmp_path / "smartshop.db"))
+    monkeypatch.setattr(db, "pool", pool)
+    yield legacy_db
+    pool.close()
@@ -0,0 +1,72 @@
+from datetime import date
+
+from backend.compaction import compact
+from backend.daily_sales import rebuild_daily_sales
+from backend.inventory import rebuild_inventory
+
+TODAY = date(2025, 1, 25)
+
+
+def _inventory(conn):
+    return conn.execute("SELECT * FROM inventory ORDER BY product_name;").fetchall()
+
+
+def _daily_sales(conn, with_id=True):
+    # A rebuild reinserts every day, so only the surrogate id may differ from the rolled-up table.
+    rows = conn.execute("SELECT * FROM daily_sales ORDER BY product_name, date_iso;").fetchall()
+    return rows if with_id else [row[1:] for row in rows]
+
+
+def _data_version(conn):
+    return conn.execute("SELECT version FROM data_version;").fetchone()[0]
+
+
+def test_compaction_keeps_derived_tables(legacy_db):
+    inventory, daily_sales = _inventory(legacy_db), _daily_sales(legacy_db)
+    rows_before = legacy_db.execute("SELECT COUNT(*) FROM my_table;").fetchone()[0]
+
+    result = compact(legacy_db, older_than_days=10, today=TODAY)
+
+    assert result["removed"] > 0
+    assert legacy_db.execute("SELECT COUNT(*) FROM my_table;").fetchone()[0] == rows_before - result["removed"]
+    assert _inventory(legacy_db) == inventory
+    assert _daily_sales(legacy_db) == daily_sales
+
+    # The folded log still rebuilds to the same tables.
+    rebuild_inventory(legacy_db)
+    rebuild_daily_sales(legacy_db)
+    legacy_db.commit()
+    assert _inventory(legacy_db) == inventory
+    assert _daily_sales(legacy_db, with_id=False) == [row[1:] for row in daily_sales]
+
+
+def test_compaction_folds_old_days_only(legacy_db):
+    cutoff = "2025-01-15"
+    recent = legacy_db.execute("SELECT * FROM my_table WHERE date_iso >= ? ORDER BY rowid;", (cutoff,)).fetchall()
+    old_totals = legacy_db.execute("""
+        SELECT product_name, date_iso, SUM(stock_sold) FROM my_table
+        WHERE date_iso < ? GROUP BY product_name, date_iso ORDER BY product_name, date_iso;
+    """, (cutoff,)).fetchall()
+
+    compact(legacy_db, older_than_days=10, today=TODAY)
+
+    assert legacy_db.execute("SELECT * FROM my_table WHERE date_iso >= ? ORDER BY rowid;", (cutoff,)).fetchall() == recent
+    assert legacy_db.execute("""
+        SELECT product_name, date_iso, stock_sold FROM my_table
+        WHERE date_iso < ? ORDER BY product_name, date_iso;
+    """, (cutoff,)).fetchall() == old_totals
+    for table in ("inventory", "daily_sales"):
+        missing = legacy_db.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE last_rowid NOT IN (SELECT rowid FROM my_table);"
+        ).fetchone()[0]
+        assert missing == 0
+
+
+def test_compaction_bumps_data_version_only_when_rows_removed(legacy_db):
+    version = _data_version(legacy_db)
+    compact(legacy_db, older_than_days=10, today=TODAY, vacuum=False)
+    compacted = _data_version(legacy_db)
+    assert compacted != version
+
+    assert compact(legacy_db, older_than_days=10, today=TODAY, vacuum=False)["removed"] == 0
+    assert _data_version(legacy_db) == compacted
@@ -0,0 +1,57 @@
+import sqlite3
+from datetime import datetime
+
+from backend.daily_sales import rebuild_daily_sales
+from backend.inventory import rebuild_inventory
+from backend.transactions import apply_transaction_lines
+
+DAY_COLUMNS = """
+    product_name, date_iso, product_id, stock_sold, stock_left, base_price, discount_percent,
+    expiry_iso, last_rowid, month, day_of_month, day_of_week, days_to_expiry, sale_seq, sales_diff, trend
+"""
+
+
+def _daily_sales(conn):
+    return conn.execute(f"SELECT {DAY_COLUMNS} FROM daily_sales ORDER BY product_name, date_iso;").fetchall()
+
+
+def _rebuilt(conn):
+    copy = sqlite3.connect(":memory:")
+    conn.backup(copy)
+    rebuild_daily_sales(copy)
+    return _daily_sales(copy)
+
+
+def test_rebuild_after_migration_is_stable(legacy_db):
+    before = _daily_sales(legacy_db)
+    assert before
+    assert _rebuilt(legacy_db) == before
+
+
+def test_incremental_rollup_matches_rebuild(legacy_db):
+    sessions = [
+        (datetime(2025, 1, 20, 9, 0), [("Rice", 3, "sell"), ("Milk", 2, "sell"), ("Rice", 5, "buy")]),
+        (datetime(2025, 1, 20, 17, 30), [("Rice", 1, "sell"), ("Sugar", 4, "sell")]),
+        (datetime(2025, 1, 21, 8, 0), [("Milk", 1, "sell"), ("Milk", 6, "sell"), ("Sugar", 2, "buy")]),
+        (datetime(2025, 1, 23, 12, 0), [("Sugar", 9, "sell"), ("Rice", 2, "sell"), ("Unknown", 1, "sell")]),
+        (datetime(2025, 1, 24, 12, 0), [("Rice", 4, "buy")]),
+    ]
+    cur = legacy_db.cursor()
+    for now, lines in sessions:
+        cur.execute("BEGIN IMMEDIATE;")
+        apply_transaction_lines(cur, lines, now=now)
+        legacy_db.commit()
+
+    assert _daily_sales(legacy_db) == _rebuilt(legacy_db)
+
+
+def test_incremental_inventory_matches_rebuild(legacy_db):
+    cur = legacy_db.cursor()
+    cur.execute("BEGIN IMMEDIATE;")
+    apply_transaction_lines(cur, [("Rice", 3, "sell"), ("Milk", 1, "buy")], now=datetime(2025, 1, 21, 10, 0))
+    legacy_db.commit()
+
+    query = "SELECT * FROM inventory ORDER BY product_name;"
+    incremental = legacy_db.execute(query).fetchall()
+    rebuild_inventory(legacy_db)
+    assert legacy_db.execute(query).fetchall() == incremental
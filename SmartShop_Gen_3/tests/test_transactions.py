@@ -0,0 +1,116 @@
+import concurrent.futures
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import transactions
+from backend.transactions import GroupCommitWriter, apply_transaction_lines
+
+NOW = datetime(2025, 1, 21, 10, 0)
+
+
+def _stock(conn, product):
+    return conn.execute("SELECT stock_left FROM inventory WHERE product_name = ?;", (product,)).fetchone()[0]
+
+
+def _row_count(conn, product):
+    return conn.execute("SELECT COUNT(*) FROM my_table WHERE product_name = ?;", (product,)).fetchone()[0]
+
+
+def _data_version(conn):
+    return conn.execute("SELECT version FROM data_version;").fetchone()[0]
+
+
+def _commit(writer, jobs):
+    """Run jobs through one group commit; returns their futures."""
+    batch = [(lines, concurrent.futures.Future()) for lines in jobs]
+    writer._commit(batch)
+    return [future for _, future in batch]
+
+
+def test_sells_in_one_batch_do_not_spend_the_same_stock(legacy_db):
+    stock = _stock(legacy_db, "Rice")
+    rows = _row_count(legacy_db, "Rice")
+
+    cur = legacy_db.cursor()
+    cur.execute("BEGIN IMMEDIATE;")
+    results = apply_transaction_lines(cur, [("Rice", stock - 1, "sell"), ("Rice", 2, "sell"), ("Rice", 1, "sell")], now=NOW)
+    legacy_db.commit()
+
+    assert [r["status"] for r in results] == [200, 400, 200]
+    assert results[1]["error"] == "Insufficient stock."
+    assert _stock(legacy_db, "Rice") == 0
+    assert _row_count(legacy_db, "Rice") == rows + 2
+
+
+def test_jobs_in_one_group_commit_do_not_spend_the_same_stock(pooled_db):
+    stock = _stock(pooled_db, "Sugar")
+
+    first, second = _commit(GroupCommitWriter(), [[("Sugar", stock, "sell")], [("Sugar", 1, "sell")]])
+
+    assert first.result()[0]["status"] == 200
+    assert second.result()[0]["status"] == 400
+    assert _stock(pooled_db, "Sugar") == 0
+
+
+def test_failing_job_does_not_undo_the_others(pooled_db, monkeypatch):
+    apply_inventory_change = transactions.apply_inventory_change
+
+    def fail_for_milk(cur, product, *args):
+        apply_inventory_change(cur, product, *args)
+        if product == "Milk":
+            raise RuntimeError("disk on fire")
+
+    monkeypatch.setattr(transactions, "apply_inventory_change", fail_for_milk)
+    before = {p: (_stock(pooled_db, p), _row_count(pooled_db, p)) for p in ("Rice", "Milk", "Sugar")}
+
+    rice, milk, sugar = _commit(
+        GroupCommitWriter(), [[("Rice", 1, "sell")], [("Milk", 1, "sell")], [("Sugar", 3, "buy")]]
+    )
+
+    assert rice.result()[0]["new_stock"] == before["Rice"][0] - 1
+    with pytest.raises(RuntimeError):
+        milk.result()
+    assert sugar.result()[0]["new_stock"] == before["Sugar"][0] + 3
+    # The failed job's insert and inventory change were rolled back with its savepoint
+    assert (_stock(pooled_db, "Milk"), _row_count(pooled_db, "Milk")) == before["Milk"]
+    assert _row_count(pooled_db, "Rice") == before["Rice"][1] + 1
+    assert _row_count(pooled_db, "Sugar") == before["Sugar"][1] + 1
+
+
+def test_rejected_lines_leave_the_data_version_alone(pooled_db):
+    version = _data_version(pooled_db)
+    rows = pooled_db.execute("SELECT COUNT(*) FROM my_table;").fetchone()[0]
+
+    [job] = _commit(GroupCommitWriter(), [[("Nope", 1, "sell"), ("Rice", 10**6, "sell")]])
+
+    assert [r["status"] for r in job.result()] == [404, 400]
+    assert pooled_db.execute("SELECT COUNT(*) FROM my_table;").fetchone()[0] == rows
+    assert _data_version(pooled_db) == version
+
+
+def test_bulk_results_follow_input_order(pooled_db):
+    from backend.ml_api import app
+
+    lines = [
+        {"product": "Rice", "quantity": 2, "type": "sell"},
+        {"product": "Rice", "quantity": 0, "type": "sell"},
+        "not a line",
+        {"product": "Nope", "quantity": 1, "type": "buy"},
+        {"product": "Milk", "quantity": 10**6, "type": "sell"},
+        {"product": "Sugar", "type": "refund"},
+        {"product": "Milk", "quantity": 4, "type": "buy"},
+    ]
+    try:
+        response = TestClient(app).post("/data/transactions/bulk", json={"lines": lines})
+    finally:
+        transactions.writer.stop()
+
+    body = response.json()
+    assert response.status_code == 200
+    assert [(r["product"], r["status"]) for r in body["results"]] == [
+        ("Rice", 200), ("Rice", 400), (None, 400), ("Nope", 404), ("Milk", 400), ("Sugar", 400), ("Milk", 200),
+    ]
+    assert body["results"][-1]["type"] == "buy"
+    assert (body["applied"], body["failed"]) == (2, 5)